@@ -39,8 +39,11 @@ import argparse
 import json
 import logging
 import re
+import time
+import threading
 
 from kconfiglib import * # pylint: disable=unused-wildcard-import
+from kconfigcache import load_kconfig, clear_shell_cache
 
 def _expr_str(sc):
     # Replace choice reference to 'y'. Because they are reference from child to parent choice config.
@@ -84,7 +87,7 @@ def is_skip_node(node):
             return True
     return False
 
-def build_nodetree(node, nodelist):
+def build_nodetree(node, nodelist, bytecode=None, lazy_help=False):
     while node:
         d = {}
         if node.item == MENU:
@@ -167,14 +170,22 @@ def build_nodetree(node, nodelist):
         if len(node.ranges) > 0:
             d['ranges'] = make_range_list(node.ranges)
 
-        if hasattr(node, "help") and isinstance(node.help, str):
+        # With lazy_help, only tell that there is a help text. It is
+        # fetched with the "help" method or --symbol-help when shown.
+        if lazy_help:
+            if node.has_help:
+                d['has_help'] = True
+        elif hasattr(node, "help") and isinstance(node.help, str):
             d['help'] = lazydecode(node.help)
 
+        if bytecode is not None:
+            bytecode.add_node(d, node)
+
         nodelist.append(d)
 
         if node.list is not None:
             d['children'] = []
-            build_nodetree(node.list, d['children'])
+            build_nodetree(node.list, d['children'], bytecode, lazy_help)
 
         # Check choice node has some child nodes after choice option.
         # No child node will happens when choice options ignored by architecture exclusion logic
@@ -187,46 +198,962 @@ def build_nodetree(node, nodelist):
 
         node = node.next
 
+#
+# Expression bytecode
+#
+# With bytecode enabled, make_menudata() adds a "bytecode" object to the root
+# node, and a "<key>_code" next to every expression string ("dep_code",
+# "cond_code", "rev_dep_code", "weak_rev_dep_code", and "cond_code" and
+# "default_code" in list entries). Its value is an index into
+# bytecode["exprs"].
+#
+#   "bytecode": {
+#     "symbols": [<name>, ...],
+#     "exprs": [[<code>, ...], ...]
+#   }
+#
+# Each expression is a postfix program for a stack machine:
+#
+#   n >= 0    push the value of symbols[n] (names as in the expression
+#             strings, i.e. quoted constants and choices as 'y')
+#   -1, k     push the value of exprs[k]
+#   -2        AND (min)          -39       OR (max)
+#   -34       NOT (2 - x)
+#   -20, -49, -28, -29, -21, -22
+#             =, !=, <, <=, >, >= (operands are the two symbols)
+#
+# Subexpressions used in more than one place are stored once and referenced
+# with -1. A referenced expression always has a lower index, so all values
+# can be calculated in a single pass over "exprs".
+#
+
+BC_REF = -1
+
+class ExprBytecode(object):
+    def __init__(self):
+        self.symbols = []
+        self.sym_ids = {}
+
+        # Hash-consed expression graph. Terms are ('s', <symbol id>) or
+        # (<op>, <term id>[, <term id>]).
+        self.terms = []
+        self.term_ids = {}
+        self.refcount = []
+        self.expr_terms = {}  # id(expr) -> term id
+
+        # (<dict>, <key>, <term id>) to be resolved by finish()
+        self.refs = []
+        # Keeps the expressions in 'expr_terms' alive
+        self.exprs = []
+
+    def _symbol(self, sc):
+        name = 'y' if isinstance(sc, Choice) else standard_sc_expr_str(sc)
+        i = self.sym_ids.get(name)
+        if i is None:
+            i = self.sym_ids[name] = len(self.symbols)
+            self.symbols.append(name)
+        return i
+
+    def _term(self, expr):
+        t = self.expr_terms.get(id(expr))
+        if t is None:
+            if type(expr) is not tuple:
+                key = ('s', self._symbol(expr))
+            elif expr[0] is NOT:
+                key = (NOT, self._term(expr[1]))
+            else:
+                key = (expr[0], self._term(expr[1]), self._term(expr[2]))
+
+            t = self.term_ids.get(key)
+            if t is None:
+                t = self.term_ids[key] = len(self.terms)
+                self.terms.append(key)
+                self.refcount.append(0)
+                # Count references from the new term to its operands
+                if key[0] != 's':
+                    for operand in key[1:]:
+                        self.refcount[operand] += 1
+
+            self.expr_terms[id(expr)] = t
+            self.exprs.append(expr)
+
+        return t
+
+    def add(self, d, key, expr):
+        t = self._term(expr)
+        self.refcount[t] += 1
+        self.refs.append((d, key, t))
+
+    def add_node(self, d, node):
+        # Adds codes for the expressions written by build_nodetree()
+        if 'rev_dep' in d:
+            self.add(d, 'rev_dep_code', node.item.rev_dep)
+        if 'weak_rev_dep' in d:
+            self.add(d, 'weak_rev_dep_code', node.item.weak_rev_dep)
+        if 'dep' in d:
+            self.add(d, 'dep_code', node.dep)
+        if 'cond' in d:
+            self.add(d, 'cond_code', node.prompt[1])
+
+        for entry, (default, cond) in zip(d.get('defaults', ()), node.defaults):
+            if type(default) is tuple:
+                self.add(entry, 'default_code', default)
+            self.add(entry, 'cond_code', cond)
+        for entry, (_, cond) in zip(d.get('selects', ()), node.selects):
+            self.add(entry, 'cond_code', cond)
+        for entry, (_, cond) in zip(d.get('implies', ()), node.implies):
+            self.add(entry, 'cond_code', cond)
+        for entry, (_, _, cond) in zip(d.get('ranges', ()), node.ranges):
+            self.add(entry, 'cond_code', cond)
+
+    def finish(self):
+        # Writes the expression indices into the registered dicts and returns
+        # the "bytecode" object
+
+        exprs = []
+        entries = {}  # term id -> index in 'exprs'
+
+        def emit(t, code):
+            term = self.terms[t]
+            if term[0] == 's':
+                code.append(term[1])
+            elif self.refcount[t] > 1:
+                code.extend((BC_REF, entry(t)))
+            else:
+                for operand in term[1:]:
+                    emit(operand, code)
+                code.append(-term[0])
+
+        def entry(t):
+            i = entries.get(t)
+            if i is None:
+                term = self.terms[t]
+                code = []
+                if term[0] == 's':
+                    code.append(term[1])
+                else:
+                    for operand in term[1:]:
+                        emit(operand, code)
+                    code.append(-term[0])
+                i = entries[t] = len(exprs)
+                exprs.append(code)
+            return i
+
+        for d, key, t in self.refs:
+            d[key] = entry(t)
+
+        return {"symbols": self.symbols, "exprs": exprs}
+
+def make_menudata(kconf, bytecode=False, lazy_help=False):
+    # Create root node
+    node = kconf.top_node
+    d = { "prompt": node.prompt[0],
+          "cond": expr_str(node.prompt[1]),
+          "children": []
+    }
+
+    bc = ExprBytecode() if bytecode else None
+    if bc is not None:
+        bc.add(d, 'cond_code', node.prompt[1])
+
+    if node.list is not None:
+        build_nodetree(node.list, d['children'], bc, lazy_help)
+
+    if bc is not None:
+        d['bytecode'] = bc.finish()
+
+    return d
+
+#
+# Compact format
+#
+# Same contents as make_menudata(), but in columnar form to reduce the JSON
+# size and parse time. All strings (symbol names, prompts, values and help)
+# are stored once in "strings" and referenced by index. Nodes are numbered
+# in tree order, node 0 is the top menu.
+#
+#   {
+#     "format": "compact",
+#     "version": 2,
+#     "strings": [<string>, ...],
+#     "exprs": [[<prefix code>, ...], ...],
+#     "nodes": {
+#       "type": [...], "parent": [...], "name": [...], ...
+#     },
+#     "children": {"offset": [...], "index": [...]}
+#   }
+#
+# Each "nodes" entry is an array indexed by node number. Strings and
+# expressions are indices into "strings" and "exprs", -1 where the nested
+# format omits the key. "help" is -2 for a help text left out by --lazy-help.
+# "visible" is a tristate value (0, 1 or 2). "flags" has bit 0 for menuconfig
+# and bit 1 for the modules symbol. "user_value" is a string too, -1 for no
+# user value (null in the nested format), with tristate user values as "n",
+# "m" or "y". "defaults", "selects", "implies" and "ranges" hold one flat
+# array per node:
+#
+#   defaults: [<name>, <default>, <cond expr>, ...]
+#   selects, implies: [<symbol name>, <cond expr>, ...]
+#   ranges: [<min>, <max>, <cond expr>, ...]
+#
+# Expressions are in prefix order. Operands are non-negative string indices,
+# written as in the nested format (quoted constants, choices as 'y').
+# Operators are negative kconfiglib token numbers, e.g. -2 (AND), -39 (OR),
+# -34 (NOT), -20 (EQUAL).
+#
+# Children of node i are children["index"][offset[i]:offset[i + 1]].
+#
+# Version history (COMPACT_VERSION):
+#
+#   1: First version. "user_value" held the raw user values (strings,
+#      tristate integers and null).
+#   2: "user_value" is an index into "strings" like the other string
+#      columns, see above.
+#
+
+COMPACT_VERSION = 2
+
+COMPACT_COLUMNS = ('type', 'parent', 'name', 'value', 'user_value', 'prompt',
+                   'cond', 'dep', 'visible', 'flags', 'rev_dep',
+                   'weak_rev_dep', 'defaults', 'selects', 'implies', 'ranges',
+                   'help')
+
+class CompactBuilder(object):
+    def __init__(self, lazy_help=False):
+        self.lazy_help = lazy_help
+        self.strings = []
+        self.string_ids = {}
+        self.exprs = []
+        self.expr_ids = {}
+        self.columns = dict((col, []) for col in COMPACT_COLUMNS)
+        self.children = []
+
+    def string(self, s):
+        if s is None:
+            return -1
+        i = self.string_ids.get(s)
+        if i is None:
+            i = self.string_ids[s] = len(self.strings)
+            self.strings.append(s)
+        return i
+
+    def user_value(self, sc):
+        # Tristate user values (and those of choices) as "n"/"m"/"y"
+        value = sc.user_value
+        if value is None:
+            return -1
+        if isinstance(sc, Choice) or sc.orig_type in (BOOL, TRISTATE):
+            value = TRI_TO_STR[value]
+        return self.string(value)
+
+    def _sc_str(self, sc):
+        if isinstance(sc, Choice):
+            return 'y'
+        return standard_sc_expr_str(sc)
+
+    def _encode(self, expr, code):
+        if type(expr) is not tuple:
+            code.append(self.string(self._sc_str(expr)))
+        else:
+            code.append(-expr[0])
+            self._encode(expr[1], code)
+            if expr[0] is not NOT:
+                self._encode(expr[2], code)
+
+    def expr(self, expr):
+        code = []
+        self._encode(expr, code)
+        key = tuple(code)
+        i = self.expr_ids.get(key)
+        if i is None:
+            i = self.expr_ids[key] = len(self.exprs)
+            self.exprs.append(code)
+        return i
+
+    def add_node(self, parent, **values):
+        i = len(self.children)
+        for col in COMPACT_COLUMNS:
+            self.columns[col].append(values.get(col, -1))
+        self.columns['parent'][i] = parent
+        self.children.append([])
+        if parent >= 0:
+            self.children[parent].append(i)
+        return i
+
+    def remove_last_node(self):
+        i = len(self.children) - 1
+        parent = self.columns['parent'][i]
+        for col in COMPACT_COLUMNS:
+            self.columns[col].pop()
+        self.children.pop()
+        self.children[parent].pop()
+
+    def build(self, node, parent):
+        # Same traversal and node skipping as build_nodetree()
+        while node:
+            v = {'flags': 0}
+            if node.item == MENU or node.item == COMMENT:
+                v['type'] = node.item
+            elif isinstance(node.item, Symbol):
+                if node.item.env_var is not None or is_skip_node(node):
+                    node = node.next
+                    continue
+
+                sym = node.item
+                v['type'] = sym.orig_type
+                v['name'] = self.string(sym.name)
+                v['value'] = self.string(sym.str_value)
+                v['user_value'] = self.user_value(sym)
+                v['flags'] = (1 if node.is_menuconfig else 0) | \
+                             (2 if sym is sym.kconfig.modules else 0)
+                if sym.rev_dep is not sym.kconfig.n:
+                    v['rev_dep'] = self.expr(sym.rev_dep)
+                if sym.weak_rev_dep is not sym.kconfig.n:
+                    v['weak_rev_dep'] = self.expr(sym.weak_rev_dep)
+            elif isinstance(node.item, Choice):
+                v['type'] = 4 # _T_CHOICE
+                v['user_value'] = self.user_value(node.item)
+            else:
+                raise RuntimeError('Unknown or unsupported node {}'.format(node))
+
+            # Choices are written as 'y', see _expr_str()
+            if node.dep is not node.kconfig.y and not isinstance(node.dep, Choice):
+                v['dep'] = self.expr(node.dep)
+            v['visible'] = expr_value(node.dep)
+
+            if node.prompt:
+                v['prompt'] = self.string(node.prompt[0])
+                if type(node.prompt[1]) is tuple or not node.prompt[1].is_constant:
+                    v['cond'] = self.expr(node.prompt[1])
+
+            defaults = []
+            for default, cond in node.defaults:
+                if type(default) is tuple:
+                    defaults.extend((-1, self.string(expr_str(default))))
+                else:
+                    defaults.extend((self.string(default.name),
+                                     self.string(default.str_value)))
+                defaults.append(self.expr(cond))
+            v['defaults'] = defaults
+
+            v['selects'] = [i for sym, cond in node.selects
+                            for i in (self.string(sym.name), self.expr(cond))]
+            v['implies'] = [i for sym, cond in node.implies
+                            for i in (self.string(sym.name), self.expr(cond))]
+            v['ranges'] = [i for _min, _max, cond in node.ranges
+                           for i in (self.string(_min.str_value),
+                                     self.string(_max.str_value),
+                                     self.expr(cond))]
+
+            if self.lazy_help:
+                if node.has_help:
+                    v['help'] = -2
+            elif hasattr(node, "help") and isinstance(node.help, str):
+                v['help'] = self.string(lazydecode(node.help))
+
+            i = self.add_node(parent, **v)
+
+            if node.list is not None:
+                self.build(node.list, i)
+
+            # Remove choice without children, see build_nodetree()
+            if v['type'] == 4 and not self.children[i]:
+                logging.info('Choice "{}" ({}) is no children, optimize remove.'.format(node.prompt[0], node.filename))
+                self.remove_last_node()
+
+            node = node.next
+
+    def result(self):
+        offset = [0]
+        index = []
+        for children in self.children:
+            index.extend(children)
+            offset.append(len(index))
+
+        return {"format": "compact",
+                "version": COMPACT_VERSION,
+                "strings": self.strings,
+                "exprs": self.exprs,
+                "nodes": self.columns,
+                "children": {"offset": offset, "index": index}}
+
+def make_compact_menudata(kconf, lazy_help=False):
+    node = kconf.top_node
+    b = CompactBuilder(lazy_help)
+    root = b.add_node(-1, type=MENU, prompt=b.string(node.prompt[0]),
+                      cond=b.expr(node.prompt[1]), visible=2, flags=0,
+                      defaults=[], selects=[], implies=[], ranges=[])
+
+    if node.list is not None:
+        b.build(node.list, root)
+
+    return b.result()
+
+#
+# Dependency graph
+#
+# --graph adds "graph" to the menu data (both formats), Kconfig.dep_graph() in
+# JSON. The webview can find who selects a symbol, or what is affected by
+# changing it, without scanning the "rev_dep" strings.
+#
+#   "graph": {
+#     "names": [<name>, ...],
+#     "symbols": <number of symbols>,
+#     "dependents": {"offset": [...], "index": [...]},
+#     "selected_by": {"offset": [...], "index": [...]},
+#     "implied_by": {"offset": [...], "index": [...]},
+#     "default_of": {"offset": [...], "index": [...]}
+#   }
+#
+# Ids are indices into "names". Symbols come first, followed by choices
+# (null for unnamed choices). Ids related to id i are
+# index[offset[i]:offset[i + 1]], same layout as "children" of the compact
+# format.
+#
+
+def make_graph(kconf):
+    graph = kconf.dep_graph()
+    d = {"names": [item.name for item in graph.items],
+         "symbols": graph.n_syms}
+    for relation in DepGraph.RELATIONS:
+        offset, index = getattr(graph, relation)
+        d[relation] = {"offset": offset, "index": index}
+    return d
+
+def olddefconfig(kconf, filename=None):
+    # Same as 'make olddefconfig'. Loads 'filename' ($KCONFIG_CONFIG or
+    # .config by default) and writes it back, with new symbols set to their
+    # default values. The file is left untouched if nothing changed.
+    logging.info(kconf.load_config(filename))
+    logging.info(kconf.write_config(filename))
+
+#
+# Profiling
+#
+# --profile writes one JSON object to stderr telling where the time went:
+# the steps of this script, and Kconfig.profile of the parse with Kconfig files
+# sorted by the time spent in themselves (excluding sourced files), and
+# $(shell,...) commands sorted by time.
+#
+
+class StepTimer(object):
+    def __init__(self):
+        self.steps = {}
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.steps[name] = self.steps.get(name, 0.0) + now - self.last
+        self.last = now
+
+def make_profile(kconf, steps):
+    d = { "steps": steps }
+    if kconf.profile is not None:
+        d["phases"] = kconf.profile["phases"]
+        d["files"] = sorted((dict(file=name, **v) for name, v in
+                             kconf.profile["files"].items()),
+                            key=lambda v: v["self"], reverse=True)
+        d["shell"] = sorted((dict(command=name, **v) for name, v in
+                             kconf.profile["shell"].items()),
+                            key=lambda v: v["time"], reverse=True)
+    return d
+
+#
+# Progress and cancellation
+#
+# --progress writes one JSON object per line to stderr as the work goes on,
+# e.g.
+#
+#   {"progress": "parse", "files": 120}
+#   {"progress": "finalize_tree", "files": 812, "symbols": 9876}
+#   ...
+#   {"progress": "load_kconfig", "files": 812, "symbols": 9876}
+#   {"progress": "load_config"}
+#   {"progress": "menudata"}
+#   {"progress": "output", "bytes": 1048576}
+#   {"progress": "done", "bytes": 5242880}
+#
+# Each record tells the step that has been completed. "parse" is repeated
+# while the Kconfig files are parsed, and the phases of Kconfig.__init__() are
+# reported as they complete (not when the snapshot is reused). "output" is
+# repeated while the menu data is written.
+#
+# A line "cancel" on stdin stops the work at the next check (between steps,
+# while parsing and while writing). {"progress": "cancelled"} is written and
+# the exit status is EXIT_CANCELLED.
+#
+
+EXIT_CANCELLED = 3
+
+PROGRESS_INTERVAL = 0.1 # seconds between repeated records
+
+class Cancelled(Exception):
+    pass
+
+class Progress(object):
+    def __init__(self, out=None, cancel_in=None):
+        self.out = out
+        self.last = 0.0
+        self.cancelled = threading.Event()
+        if cancel_in is not None:
+            t = threading.Thread(target=self._watch, args=(cancel_in,))
+            t.daemon = True
+            t.start()
+
+    def _watch(self, f):
+        for line in iter(f.readline, ''):
+            if line.strip() == 'cancel':
+                self.cancelled.set()
+                return
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise Cancelled()
+
+    def report(self, phase, repeat=False, **values):
+        # Records with 'repeat' are dropped if the last one was written less
+        # than PROGRESS_INTERVAL ago
+        self.check()
+        if self.out is None:
+            return
+        now = time.perf_counter()
+        if repeat and now - self.last < PROGRESS_INTERVAL:
+            return
+        self.last = now
+        record = {'progress': phase}
+        record.update(values)
+        self.out.write(json.dumps(record) + '\n')
+        self.out.flush()
+
+    def kconfig(self, kconf, phase):
+        # Kconfig(progress=...) callback
+        if phase == 'parse' and kconf._parsing_kconfigs:
+            self.report(phase, True, files=len(kconf.kconfig_filenames))
+        else:
+            self.report(phase, files=len(kconf.kconfig_filenames),
+                        symbols=len(kconf.defined_syms))
+
+#
+# Output
+#
+# The menu data is written while it is encoded, in pieces, instead of
+# building the whole string first. json.dumps() is several times faster than
+# json.JSONEncoder().iterencode(), which is pure Python, so only the upper
+# levels of menus and long arrays are split up here and everything else is
+# left to json.dumps().
+# The result is the same as json.dumps(d).
+#
+
+OUTPUT_LEVELS = 2
+OUTPUT_SLICE = 4096
+OUTPUT_BUFFER = 256 * 1024
+
+def _splittable(o, levels):
+    # The upper 'levels' levels of menus, and long arrays of the compact
+    # format are worth splitting
+    if type(o) is list:
+        return len(o) > OUTPUT_SLICE or \
+               (levels > 0 and len(o) > 0 and type(o[0]) is dict and
+                any('children' in v for v in o))
+    return any(_splittable(v, levels) for v in o.values()
+               if type(v) in (list, dict))
+
+def iterencode(o, levels=OUTPUT_LEVELS):
+    if type(o) is dict and _splittable(o, levels):
+        # Items that are not split up are encoded together
+        sep = '{'
+        plain = {}
+        for key, value in o.items():
+            if type(value) not in (list, dict) or not _splittable(value, levels):
+                plain[key] = value
+                continue
+            if plain:
+                yield sep + json.dumps(plain)[1:-1]
+                sep = ', '
+                plain = {}
+            yield sep + json.dumps(key) + ': '
+            for chunk in iterencode(value, levels):
+                yield chunk
+            sep = ', '
+        if plain:
+            yield sep + json.dumps(plain)[1:-1]
+        yield '}'
+    elif type(o) is list and _splittable(o, levels):
+        yield '['
+        if type(o[0]) is dict:
+            # Menu nodes
+            for i, value in enumerate(o):
+                if i:
+                    yield ', '
+                for chunk in iterencode(value, levels - 1):
+                    yield chunk
+        else:
+            # Strings, numbers or small lists in slices
+            for i in range(0, len(o), OUTPUT_SLICE):
+                if i:
+                    yield ', '
+                yield json.dumps(o[i:i + OUTPUT_SLICE])[1:-1]
+        yield ']'
+    else:
+        yield json.dumps(o)
+
+def write_json(d, f, progress):
+    # Returns the number of bytes written (the output is ASCII)
+    chunks = []
+    size = 0
+    total = 0
+    for chunk in iterencode(d):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= OUTPUT_BUFFER:
+            f.write(''.join(chunks))
+            total += size
+            chunks = []
+            size = 0
+            progress.report('output', True, bytes=total)
+    f.write(''.join(chunks))
+    return total + size
+
+#
+# Server mode
+#
+# Keep one Kconfig instance alive and answer JSON-RPC 2.0 requests, one JSON
+# object per line on stdin. Each response is written as one line to stdout.
+# e.g.
+#
+#   --> {"jsonrpc": "2.0", "id": 1, "method": "set_value", "params": {"name": "DEBUG", "value": "y"}}
+#   <-- {"jsonrpc": "2.0", "id": 1, "result": true}
+#
+# Requests without "id" are notifications and have no response.
+#
+
+RPC_PARSE_ERROR = -32700
+RPC_INVALID_REQUEST = -32600
+RPC_METHOD_NOT_FOUND = -32601
+RPC_INVALID_PARAMS = -32602
+RPC_INTERNAL_ERROR = -32603
+
+class RPCError(Exception):
+    def __init__(self, code, message):
+        Exception.__init__(self, message)
+        self.code = code
+        self.message = message
+
+# JSON types of parameters, for _get_param()
+_STRING = ((str, type(u'')), 'a string')
+_BOOL = ((bool,), 'a boolean')
+_ARRAY = ((list,), 'an array')
+_OBJECT = ((dict,), 'an object')
+# set_value() takes tristate values as 0/1/2 too
+_VALUE = ((str, type(u''), int), 'a string or an integer')
+
+def _get_param(params, name, default=None, required=False, kind=None):
+    if name not in params:
+        if required:
+            raise RPCError(RPC_INVALID_PARAMS, 'Missing parameter "{}"'.format(name))
+        return default
+    value = params[name]
+    # null is taken as the default, except for required parameters
+    if value is None and not required:
+        return default
+    if kind is not None:
+        types, desc = kind
+        if not isinstance(value, types) or \
+           (isinstance(value, bool) and bool not in types):
+            raise RPCError(RPC_INVALID_PARAMS,
+                           'Parameter "{}" must be {}'.format(name, desc))
+    return value
+
+def _get_item(kconf, name):
+    # Symbols and named choices can be specified
+    if not isinstance(name, _STRING[0]):
+        raise RPCError(RPC_INVALID_PARAMS, 'Symbol name must be a string')
+    if name in kconf.syms:
+        return kconf.syms[name]
+    if name in kconf.named_choices:
+        return kconf.named_choices[name]
+    raise RPCError(RPC_INVALID_PARAMS, 'Unknown symbol "{}"'.format(name))
+
+def make_delta_list(items):
+    # Current state of symbols and choices from Kconfig.set_value_delta()
+    ret = []
+    for item in items:
+        d = {"name": item.name,
+             "value": item.str_value,
+             "visible": TRI_TO_STR[item.visibility],
+             "assignable": [TRI_TO_STR[v] for v in item.assignable]}
+        if isinstance(item, Choice):
+            d['type'] = 4 # _T_CHOICE
+            d['selection'] = item.selection.name if item.selection else None
+        ret.append(d)
+    return ret
+
+def make_help_list(item):
+    # Help texts of all definitions of 'item', None for no help
+    return [lazydecode(node.help) if node.has_help else None
+            for node in item.nodes]
+
+def rpc_menu(kconf, params):
+    lazy_help = _get_param(params, 'lazy_help', False, kind=_BOOL)
+    if _get_param(params, 'format', 'nested', kind=_STRING) == 'compact':
+        return make_compact_menudata(kconf, lazy_help)
+    return make_menudata(kconf, _get_param(params, 'bytecode', False, kind=_BOOL),
+                         lazy_help)
+
+def rpc_graph(kconf, params):
+    return make_graph(kconf)
+
+def rpc_help(kconf, params):
+    return make_help_list(_get_item(kconf, _get_param(params, 'name', required=True)))
+
+# With "delta": true, set_value and unset_value return the symbols and
+# choices that have been changed, instead of true/false.
+
+def rpc_set_value(kconf, params):
+    item = _get_item(kconf, _get_param(params, 'name', required=True))
+    value = _get_param(params, 'value', required=True, kind=_VALUE)
+    if _get_param(params, 'delta', False, kind=_BOOL):
+        return make_delta_list(kconf.set_value_delta(item, value))
+    return item.set_value(value)
+
+def rpc_unset_value(kconf, params):
+    item = _get_item(kconf, _get_param(params, 'name', required=True))
+    if _get_param(params, 'delta', False, kind=_BOOL):
+        return make_delta_list(kconf.unset_value_delta(item))
+    item.unset_value()
+    return True
+
+def rpc_set_values(kconf, params):
+    values = _get_param(params, 'values', required=True, kind=_OBJECT)
+    for value in values.values():
+        if not isinstance(value, _VALUE[0]) or isinstance(value, bool):
+            raise RPCError(RPC_INVALID_PARAMS, 'Values must be strings or integers')
+    return kconf.set_values(dict((_get_item(kconf, name), value)
+                                 for name, value in values.items()))
+
+def rpc_get_values(kconf, params):
+    names = _get_param(params, 'names', kind=_ARRAY)
+    if names is None:
+        syms = kconf.unique_defined_syms
+    else:
+        syms = [_get_item(kconf, name) for name in names]
+    return dict((sym.name, sym.str_value) for sym in syms)
+
+def rpc_load_config(kconf, params):
+    return kconf.load_config(_get_param(params, 'filename', kind=_STRING),
+                             _get_param(params, 'replace', True, kind=_BOOL))
+
+def rpc_write_config(kconf, params):
+    return kconf.write_config(_get_param(params, 'filename', kind=_STRING))
+
+def rpc_write_min_config(kconf, params):
+    return kconf.write_min_config(_get_param(params, 'filename', required=True,
+                                             kind=_STRING))
+
+RPC_METHODS = {
+    'menu': rpc_menu,
+    'set_value': rpc_set_value,
+    'unset_value': rpc_unset_value,
+    'set_values': rpc_set_values,
+    'help': rpc_help,
+    'graph': rpc_graph,
+    'get_values': rpc_get_values,
+    'load_config': rpc_load_config,
+    'write_config': rpc_write_config,
+    'write_min_config': rpc_write_min_config,
+}
+
+def handle_request(kconf, line):
+    # Returns response object, or None for notifications. Notifications get
+    # no response even on errors, except for parse errors and invalid
+    # requests, where it isn't known whether the request was one.
+
+    reqid = None
+    notification = False
+    try:
+        try:
+            req = json.loads(line)
+        except ValueError as e:
+            raise RPCError(RPC_PARSE_ERROR, str(e))
+
+        if not isinstance(req, dict):
+            raise RPCError(RPC_INVALID_REQUEST, 'Invalid request')
+        reqid = req.get('id')
+        if not isinstance(req.get('method'), _STRING[0]):
+            raise RPCError(RPC_INVALID_REQUEST, 'Invalid request')
+        notification = 'id' not in req
+
+        method = RPC_METHODS.get(req['method'])
+        if method is None:
+            raise RPCError(RPC_METHOD_NOT_FOUND, 'Unknown method "{}"'.format(req['method']))
+
+        params = req.get('params', {})
+        if not isinstance(params, dict):
+            raise RPCError(RPC_INVALID_PARAMS, 'params must be an object')
+
+        result = method(kconf, params)
+        if notification:
+            return None
+        return {"jsonrpc": "2.0", "id": reqid, "result": result}
+
+    except RPCError as e:
+        error = {"code": e.code, "message": e.message}
+    except (KconfigError, EnvironmentError) as e:
+        error = {"code": RPC_INTERNAL_ERROR, "message": str(e)}
+    except (TypeError, ValueError) as e:
+        # Parameters of unexpected shape not caught above
+        error = {"code": RPC_INVALID_PARAMS, "message": str(e)}
+    except Exception as e:
+        # Keep serving the next requests
+        error = {"code": RPC_INTERNAL_ERROR,
+                 "message": "{}: {}".format(type(e).__name__, e)}
+
+    if notification:
+        return None
+    return {"jsonrpc": "2.0", "id": reqid, "error": error}
+
+def serve(kconf, infile, outfile):
+    while True:
+        line = infile.readline()
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+
+        res = handle_request(kconf, line)
+        if res is not None:
+            outfile.write(json.dumps(res) + '\n')
+            outfile.flush()
+
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='Create JSON from Kconfig')
     parser.add_argument('-o', '--output', type=str, nargs=1, help='Output file')
     parser.add_argument('-d', '--debug', action='store_true')
     parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('-c', '--cache', type=str, metavar='DIR',
+                        help='Directory to store parsed Kconfig snapshot')
+    parser.add_argument('--shell-cache-ttl', type=float, metavar='SECONDS',
+                        help='Remember $(shell,...) outputs in the cache directory for SECONDS')
+    parser.add_argument('--clear-shell-cache', action='store_true',
+                        help='Forget $(shell,...) outputs remembered in the cache directory')
+    parser.add_argument('-j', '--prefetch', action='store_true',
+                        help='Read sourced Kconfig files in parallel')
+    parser.add_argument('-f', '--format', choices=('nested', 'compact'),
+                        default='nested', help='Menu data format')
+    parser.add_argument('-b', '--bytecode', action='store_true',
+                        help='Add postfix bytecode of expressions to the menu data')
+    parser.add_argument('-g', '--graph', action='store_true',
+                        help='Add dependency graph of symbols to the menu data')
+    parser.add_argument('--lazy-help', action='store_true',
+                        help='Leave help texts out of the menu data')
+    parser.add_argument('--symbol-help', type=str, metavar='NAME',
+                        help='Output help texts of a symbol instead of the menu data')
+    parser.add_argument('--olddefconfig', action='store_true',
+                        help='Update the configuration like "make olddefconfig"')
+    parser.add_argument('--olddefconfig-file', action='append', default=[],
+                        metavar='CONFIG',
+                        help='Also update CONFIG like --olddefconfig')
+    parser.add_argument('--serve', action='store_true',
+                        help='Serve JSON-RPC requests on stdin/stdout')
+    parser.add_argument('--progress', action='store_true',
+                        help='Write progress to stderr as JSON lines, and stop on "cancel" from stdin')
+    parser.add_argument('--profile', action='store_true',
+                        help='Write timings of parsing and each step to stderr as JSON')
     parser.add_argument('kconfig', metavar='<Kconfig file>', type=str, nargs='?',
                         default='Kconfig', help='Path to Kconfig')
     opts = parser.parse_args()
 
-    kconf = Kconfig(opts.kconfig, warn=False)
-    if opts.verbose:
-        kconf.enable_warnings()
-    kconf.load_config()
-
-    # Create root node
-    node = kconf.top_node
-    d = { "prompt": node.prompt[0],
-          "cond": expr_str(node.prompt[1]),
-          "children": []
-    }
+    # The shell cache lives in the cache directory
+    if opts.clear_shell_cache and not opts.cache:
+        parser.error('--clear-shell-cache requires --cache')
+    if opts.shell_cache_ttl and not opts.cache:
+        parser.error('--shell-cache-ttl requires --cache')
 
     if opts.verbose:
         logging.basicConfig(level=logging.INFO)
     if opts.debug:
         logging.basicConfig(level=logging.DEBUG)
 
-    if node.list is not None:
-        build_nodetree(node.list, d['children'])
+    timer = StepTimer()
 
-    if opts.output:
-        f = open(opts.output[0], 'w')
-    else:
-        f = sys.stdout
+    # stdin carries the requests in server mode, so no cancellation there
+    progress = Progress(sys.stderr if opts.progress else None,
+                        sys.stdin if opts.progress and not opts.serve else None)
 
-    # f.write('var menudata = ' + json.dumps(d) + ';\n')
-    if opts.debug:
-        f.write(json.dumps(d, indent=4))
-    else:
-        f.write(json.dumps(d))
+    try:
+        if opts.clear_shell_cache:
+            clear_shell_cache(opts.cache)
+
+        kconf = load_kconfig(opts.kconfig, opts.cache, warn=False,
+                             prefetch=opts.prefetch,
+                             lazy_help=opts.lazy_help or
+                                       opts.symbol_help is not None,
+                             profile=opts.profile,
+                             shell_ttl=opts.shell_cache_ttl,
+                             progress=progress.kconfig if opts.progress else None)
+        if opts.verbose:
+            kconf.enable_warnings()
+        timer.lap('load_kconfig')
+        progress.report('load_kconfig', files=len(kconf.kconfig_filenames),
+                        symbols=len(kconf.unique_defined_syms))
+
+        for filename in opts.olddefconfig_file:
+            olddefconfig(kconf, filename)
+
+        if opts.olddefconfig:
+            olddefconfig(kconf)
+        else:
+            kconf.load_config()
+        timer.lap('load_config')
+        progress.report('load_config')
+
+        if opts.serve:
+            if opts.profile:
+                sys.stderr.write(json.dumps(make_profile(kconf, timer.steps)) + '\n')
+            serve(kconf, sys.stdin, sys.stdout)
+            sys.exit(0)
+
+        if opts.symbol_help is not None:
+            if opts.symbol_help in kconf.syms:
+                d = make_help_list(kconf.syms[opts.symbol_help])
+            elif opts.symbol_help in kconf.named_choices:
+                d = make_help_list(kconf.named_choices[opts.symbol_help])
+            else:
+                sys.exit('Unknown symbol "{}"'.format(opts.symbol_help))
+        elif opts.format == 'compact':
+            d = make_compact_menudata(kconf, opts.lazy_help)
+        else:
+            d = make_menudata(kconf, opts.bytecode, opts.lazy_help)
+        if opts.graph and opts.symbol_help is None:
+            d['graph'] = make_graph(kconf)
+        timer.lap('menudata')
+        progress.report('menudata')
+
+        if opts.output:
+            f = open(opts.output[0], 'w')
+        else:
+            f = sys.stdout
+
+        # f.write('var menudata = ' + json.dumps(d) + ';\n')
+        if opts.debug:
+            f.write(json.dumps(d, indent=4))
+            size = f.tell() if opts.output else None
+        else:
+            size = write_json(d, f, progress)
+
+        if opts.output:
+            f.close()
+        else:
+            f.flush()
+        timer.lap('output')
+        progress.report('done', bytes=size)
+
+    except Cancelled:
+        progress.cancelled.clear()
+        progress.report('cancelled')
+        sys.exit(EXIT_CANCELLED)
 
-    if opts.output:
-        f.close()
+    if opts.profile:
+        sys.stderr.write(json.dumps(make_profile(kconf, timer.steps)) + '\n')
@@ -0,0 +1,464 @@
+############################################################################
+# helper/kconfigcache.py
+#
+#   Copyright 2026 Sony Semiconductor Solutions Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+# 3. Neither the name of Sony Semiconductor Solutions Corporation nor
+#    the names of its contributors may be used to endorse or promote
+#    products derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS
+# OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+############################################################################
+
+# On-disk snapshot of a parsed and finalized Kconfig object.
+#
+# Parsing the whole NuttX + SDK Kconfig tree takes seconds, and the result
+# only depends on the Kconfig files and a handful of environment variables.
+# load_kconfig() stores the parsed object next to a manifest of those inputs,
+# and reuses it as long as none of them has changed.
+#
+# Snapshot validity is judged by:
+#
+#   - size, mtime and SHA-1 of every file in Kconfig.kconfig_filenames. The
+#     hash is only computed when size or mtime differ, so files regenerated
+#     with identical contents (e.g. by 'make apps_preconfig') still hit.
+#   - the result of every 'source' glob, to notice added/removed files.
+#   - the values of the environment variables in Kconfig.env_vars, the
+#     'option env' variables, and the variables read by Kconfig.__init__().
+#
+# Output of $(shell,...) macros is not part of the manifest.
+#
+# When the tree has to be parsed again, ShellCache can remember the output of
+# $(shell,...) commands for a while, in SHELL_CACHE_FILE next to the snapshots.
+# Spawning a shell is slow, especially on Windows hosts.
+#
+# Snapshots are pickles, and loading one runs code chosen by whoever wrote
+# it. The cache directory should be a per-user location. It is created with
+# mode 0700, and the directory and every file in it are only used if they
+# are owned by the current user and not writable by others (see
+# _check_private()). Otherwise the cache is not used at all.
+
+import os
+import sys
+import glob
+import stat
+import errno
+import json
+import time
+import pickle
+import hashlib
+import logging
+
+import kconfiglib
+from kconfiglib import Kconfig, Symbol, Choice, MenuNode, Variable
+
+# Bump when the snapshot layout changes
+CACHE_VERSION = 2
+
+# POSIX file ownership is not meaningful on Windows hosts (incl. MSYS2)
+_CHECK_OWNER = hasattr(os, 'getuid') and \
+               not sys.platform.startswith(('win32', 'cygwin', 'msys'))
+
+# Name of the ShellCache file in the cache directory
+SHELL_CACHE_FILE = 'shell.json'
+
+# Environment variables read by Kconfig.__init__() itself
+_INIT_ENV_VARS = ('srctree', 'CONFIG_', 'KCONFIG_FUNCTIONS',
+                  'KCONFIG_WARN_UNDEF', 'KCONFIG_WARN_UNDEF_ASSIGN',
+                  'KCONFIG_STRICT')
+
+# Objects of these classes are written as empty shells first and get their
+# attributes restored afterwards. Plain pickling follows 'next' pointers and
+# '_dependents' sets recursively, and runs out of stack on the NuttX tree.
+_SHELL_CLASSES = (Kconfig, Symbol, Choice, MenuNode, Variable)
+
+def _new_shell(cls):
+    return object.__new__(cls)
+
+if sys.version_info >= (3, 8):
+    class _SnapshotPickler(pickle.Pickler):
+        def reducer_override(self, obj):
+            if obj.__class__ in _SHELL_CLASSES:
+                return (_new_shell, (obj.__class__,))
+            return NotImplemented
+else:
+    # Python < 3.8, snapshots are not supported
+    _SnapshotPickler = None
+
+def _slots(cls):
+    ret = []
+    for c in cls.__mro__:
+        ret.extend(c.__dict__.get('__slots__', ()))
+    return ret
+
+def _collect_objects(kconf):
+    # Returns all Kconfig-related objects reachable from 'kconf', 'kconf'
+    # itself first
+
+    objs = [kconf]
+    seen = set([id(kconf)])
+
+    def add(obj):
+        if id(obj) not in seen:
+            seen.add(id(obj))
+            objs.append(obj)
+
+    for d in (kconf.syms, kconf.const_syms, kconf.named_choices, kconf.variables):
+        for obj in d.values():
+            add(obj)
+    for choice in kconf.choices:
+        add(choice)
+
+    # Menu nodes, including 'if' nodes removed by _remove_ifs() that are
+    # still referenced as parents
+    add(kconf.top_node)
+    for node in kconf.node_iter():
+        add(node)
+        while node.parent is not None:
+            node = node.parent
+            add(node)
+    for sc in list(kconf.syms.values()) + kconf.choices:
+        for node in sc.nodes:
+            add(node)
+
+    return objs
+
+def _get_state(obj):
+    state = {}
+    for name in _slots(obj.__class__):
+        try:
+            state[name] = getattr(obj, name)
+        except AttributeError:
+            # Slots that are only set lazily (e.g. Symbol._old_val)
+            pass
+    return state
+
+def _file_digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _abspath(kconf, filename):
+    return os.path.abspath(os.path.join(kconf.srctree, filename))
+
+def _env_snapshot(kconf):
+    names = set(kconf.env_vars)
+    names.update(_INIT_ENV_VARS)
+    for sym in kconf.unique_defined_syms:
+        if sym.env_var is not None:
+            names.add(sym.env_var)
+    return dict((name, os.environ.get(name)) for name in sorted(names))
+
+def _make_manifest(kconf):
+    files = []
+    for filename in sorted(set(kconf.kconfig_filenames)):
+        path = _abspath(kconf, filename)
+        st = os.stat(path)
+        files.append([path, st.st_size, st.st_mtime_ns, _file_digest(path)])
+
+    return {
+        'version': CACHE_VERSION,
+        'files': files,
+        'globs': [[pattern, matches] for pattern, matches in kconf._source_globs],
+        'env': _env_snapshot(kconf),
+    }
+
+def _check_manifest(manifest):
+    # Returns (valid, touched). 'touched' is True if some file has new stat
+    # values but the same contents, in which case the manifest is worth
+    # rewriting to keep the fast path next time.
+
+    if manifest.get('version') != CACHE_VERSION:
+        return False, False
+
+    for name, value in manifest['env'].items():
+        if os.environ.get(name) != value:
+            logging.info('Kconfig cache: ${} changed'.format(name))
+            return False, False
+
+    for pattern, matches in manifest['globs']:
+        if sorted(glob.iglob(pattern)) != matches:
+            logging.info('Kconfig cache: {} matches other files'.format(pattern))
+            return False, False
+
+    touched = False
+    for entry in manifest['files']:
+        path, size, mtime, digest = entry
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False, False
+        if st.st_size == size and st.st_mtime_ns == mtime:
+            continue
+        if st.st_size != size or _file_digest(path) != digest:
+            logging.info('Kconfig cache: {} modified'.format(path))
+            return False, False
+        entry[2] = st.st_mtime_ns
+        touched = True
+
+    return True, touched
+
+def _cache_key(filename, warn, lazy_help):
+    srctree = os.getenv('srctree', '')
+    lib = os.stat(kconfiglib.__file__)
+    key = '\0'.join([os.path.abspath(os.path.join(srctree, filename)),
+                     os.path.abspath(srctree), str(warn), str(lazy_help),
+                     sys.version,
+                     str(lib.st_size), str(lib.st_mtime_ns)])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def _check_owner(st, path):
+    if _CHECK_OWNER and st.st_uid != os.getuid():
+        raise OSError(errno.EPERM, 'Not owned by the current user', path)
+
+def _check_private(st, path):
+    # Raises OSError unless the file or directory with stat result 'st' is
+    # owned by the current user and not writable by group or others. Not
+    # checked where POSIX ownership is not available (Windows hosts).
+
+    _check_owner(st, path)
+    if _CHECK_OWNER and st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise OSError(errno.EPERM, 'Writable by other users', path)
+
+def _open_private(path, mode):
+    # open() for reading, checking the file with _check_private() first
+    f = open(path, mode)
+    try:
+        _check_private(os.fstat(f.fileno()), path)
+    except Exception:
+        f.close()
+        raise
+    return f
+
+def _prepare_cachedir(cachedir):
+    # Creates 'cachedir' (mode 0700) if missing, and checks that it is
+    # private. Returns False if it can't be used.
+
+    try:
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir, 0o700)
+        # A link planted by someone else is not accepted either
+        _check_owner(os.lstat(cachedir), cachedir)
+        _check_private(os.stat(cachedir), cachedir)
+    except OSError as e:
+        logging.warning('Kconfig cache: not used ({})'.format(e))
+        return False
+    return True
+
+def _write_atomic(path, data, mode):
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, mode) as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def save_snapshot(kconf, path):
+    # Writes 'kconf' to 'path'. Must be called right after Kconfig.__init__(),
+    # before any user values are set.
+
+    # The file object of the top-level Kconfig has already been closed
+    kconf._readline = None
+
+    objs = _collect_objects(kconf)
+    states = [_get_state(obj) for obj in objs]
+
+    # Timings of this parse mean nothing for the loads of the snapshot, and
+    # the shell cache is saved by itself
+    states[0]['profile'] = None
+    states[0]['_shell_cache'] = None
+
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        _SnapshotPickler(f, pickle.HIGHEST_PROTOCOL).dump((objs, states))
+    os.replace(tmp, path)
+
+def load_snapshot(path):
+    # Raises OSError if 'path' could have been written by another user, as
+    # unpickling it would run their code
+    with _open_private(path, 'rb') as f:
+        objs, states = pickle.load(f)
+
+    for obj, state in zip(objs, states):
+        for name, value in state.items():
+            setattr(obj, name, value)
+
+    return objs[0]
+
+class ShellCache(object):
+    '''Output of $(shell,...) commands, kept in a JSON file
+
+    Pass to Kconfig(shell_cache=...). Outputs are keyed by command and
+    working directory, and expire 'ttl' seconds after the command was run.
+    Call save() after parsing to write new outputs back to 'path'.
+    '''
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self.dirty = False
+
+        try:
+            with _open_private(path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION:
+                for command, cwd, output, stamp in data['entries']:
+                    self.entries[(command, cwd)] = (output, stamp)
+        except (EnvironmentError, ValueError, KeyError, TypeError) as e:
+            logging.info('Kconfig shell cache: not loaded ({})'.format(e))
+
+    def get(self, command, cwd):
+        entry = self.entries.get((command, cwd))
+        if entry is None:
+            return None
+        if time.time() - entry[1] > self.ttl:
+            del self.entries[(command, cwd)]
+            self.dirty = True
+            return None
+        return entry[0]
+
+    def set(self, command, cwd, output):
+        self.entries[(command, cwd)] = (output, time.time())
+        self.dirty = True
+
+    def invalidate(self, command=None):
+        '''Forget the output of 'command', or of all commands if None'''
+        for key in list(self.entries):
+            if command is None or key[0] == command:
+                del self.entries[key]
+                self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        now = time.time()
+        entries = [[command, cwd, output, stamp]
+                   for (command, cwd), (output, stamp) in self.entries.items()
+                   if now - stamp <= self.ttl]
+        _write_atomic(self.path, json.dumps({'version': CACHE_VERSION,
+                                             'entries': entries}), 'w')
+        self.dirty = False
+
+def clear_shell_cache(cachedir):
+    '''Forget all outputs remembered by ShellCache in the cache directory'''
+    try:
+        os.remove(os.path.join(cachedir, SHELL_CACHE_FILE))
+    except OSError:
+        pass
+
+def _load_cached(manifest_path, snapshot_path):
+    # Returns the snapshot if it is still valid, and None otherwise
+
+    try:
+        with _open_private(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        valid, touched = _check_manifest(manifest)
+        if valid:
+            kconf = load_snapshot(snapshot_path)
+            logging.info('Kconfig cache: loaded {}'.format(snapshot_path))
+            if touched:
+                _write_atomic(manifest_path, json.dumps(manifest), 'w')
+            return kconf
+    except Exception as e:
+        logging.info('Kconfig cache: miss ({})'.format(e))
+
+    return None
+
+def _save_shell_cache(shell_cache):
+    if shell_cache is None:
+        return
+    try:
+        shell_cache.save()
+    except Exception as e:
+        logging.warning('Kconfig shell cache: could not save ({})'.format(e))
+
+def load_kconfig(filename='Kconfig', cachedir=None, warn=True, prefetch=False,
+                 lazy_help=False, profile=False, shell_ttl=None,
+                 progress=None):
+    '''Returns a parsed Kconfig object for 'filename'
+
+    If 'cachedir' is given, a snapshot from a previous parse is reused when
+    none of its inputs has changed, and a new snapshot is stored otherwise.
+    Cache errors are never fatal, the tree is just parsed again.
+
+    'prefetch' and 'lazy_help' are passed to Kconfig() when the tree has to
+    be parsed. Snapshots with and without 'lazy_help' are kept apart.
+
+    If 'profile' is True (or $KCONFIG_PROFILE is 'y'), the tree is always
+    parsed so Kconfig.profile tells where the parsing time goes. The snapshot
+    is still refreshed.
+
+    If 'shell_ttl' is given (in seconds), the output of $(shell,...) commands
+    is remembered in 'cachedir' for that long, see ShellCache.
+
+    'progress' is passed to Kconfig() too. It is not called when the snapshot
+    is reused.
+    '''
+
+    profile = profile or os.getenv('KCONFIG_PROFILE') == 'y'
+
+    if cachedir is not None and not _prepare_cachedir(cachedir):
+        cachedir = None
+
+    shell_cache = None
+    if cachedir is not None and shell_ttl:
+        shell_cache = ShellCache(os.path.join(cachedir, SHELL_CACHE_FILE),
+                                 shell_ttl)
+
+    if cachedir is None or _SnapshotPickler is None:
+        kconf = Kconfig(filename, warn=warn, prefetch=prefetch,
+                        lazy_help=lazy_help, profile=profile,
+                        shell_cache=shell_cache, progress=progress)
+        _save_shell_cache(shell_cache)
+        return kconf
+
+    key = _cache_key(filename, warn, lazy_help)
+    manifest_path = os.path.join(cachedir, key + '.json')
+    snapshot_path = os.path.join(cachedir, key + '.pickle')
+
+    if not profile:
+        kconf = _load_cached(manifest_path, snapshot_path)
+        if kconf is not None:
+            return kconf
+
+    kconf = Kconfig(filename, warn=warn, prefetch=prefetch,
+                    lazy_help=lazy_help, profile=profile,
+                    shell_cache=shell_cache, progress=progress)
+
+    try:
+        manifest = _make_manifest(kconf)
+        save_snapshot(kconf, snapshot_path)
+        _write_atomic(manifest_path, json.dumps(manifest), 'w')
+    except Exception as e:
+        logging.warning('Kconfig cache: could not save snapshot ({})'.format(e))
+
+    _save_shell_cache(shell_cache)
+
+    return kconf
@@ -455,6 +455,16 @@ Some optional warnings can be controlled via environment variables:
     variable.
 
 
+Profiling
+---------
+
+If the KCONFIG_PROFILE environment variable is set to 'y' (or profile=True is
+passed to Kconfig.__init__()), Kconfig.__init__() records where the parsing
+time goes in Kconfig.profile: wall time and call counts for each phase of
+initialization, for each Kconfig file, and for each $(shell,...) command. This
+helps finding slow Kconfig files and preprocessor calls in large trees.
+
+
 Preprocessor user functions defined in Python
 ---------------------------------------------
 
@@ -537,11 +547,14 @@ service, or open a ticket on the GitHub page.
 """
 import errno
 import importlib
+import io
 import os
 import re
 import sys
+import time
 
 # Get rid of some attribute lookups. These are obvious in context.
+from contextlib import contextmanager
 from glob import iglob
 from os.path import dirname, exists, expandvars, islink, join, realpath
 
@@ -788,13 +801,26 @@ class Kconfig(object):
 
       Like for srctree, only the value of $CONFIG_ when the configuration is
       loaded matters.
+
+    profile:
+      None, unless profiling was enabled (see the 'profile' parameter to
+      Kconfig.__init__()). Then a dict with the keys "phases", "files", and
+      "shell", each mapping a name to a dict with the wall time spent in
+      seconds ("time") and the number of calls ("calls"):
+
+        "phases": Phases of Kconfig.__init__(), e.g. "parse",
+                  "finalize_tree", and "check_dep_loop".
+
+        "files": Kconfig files (as in MenuNode.filename). These also have a
+                 "self" entry, which excludes the time spent in files they
+                 source.
+
+        "shell": Commands run with $(shell,...).
     """
     __slots__ = (
         "_encoding",
         "_functions",
-        "_set_match",
         "_srctree_prefix",
-        "_unset_match",
         "_warn_no_prompt",
         "choices",
         "comments",
@@ -811,6 +837,7 @@ class Kconfig(object):
         "modules",
         "n",
         "named_choices",
+        "profile",
         "srctree",
         "syms",
         "top_node",
@@ -836,6 +863,25 @@ class Kconfig(object):
         "_tokens",
         "_tokens_i",
         "_reuse_tokens",
+        "_source_globs",
+        "_exprs",
+        "_prefetched",
+        "_token_memo",
+        "_lazy_help",
+        "_profile_stack",
+        "_shell_cache",
+        "_progress",
+
+        # Change tracking, see set_value_delta()
+        "_old_states",
+        "_deferred",
+        "_value_gen",
+        "_written",
+        "_str_prefix",
+
+        # Evaluation order, see evaluate_shallow()
+        "_eval_order",
+        "_eval_gen",
     )
 
     #
@@ -843,7 +889,8 @@ class Kconfig(object):
     #
 
     def __init__(self, filename="Kconfig", warn=True, warn_to_stderr=True,
-                 encoding="utf-8"):
+                 encoding="utf-8", prefetch=False, lazy_help=False,
+                 profile=False, shell_cache=None, progress=None):
         """
         Creates a new Kconfig object by parsing Kconfig files.
         Note that Kconfig files are not the same as .config files (which store
@@ -903,7 +950,52 @@ class Kconfig(object):
           anyway.
 
           Related PEP: https://www.python.org/dev/peps/pep-0538/
+
+        prefetch (default: False):
+          True if the 'source'd Kconfig files should be read ahead in a thread
+          pool before parsing. This overlaps the I/O latency of the many small
+          files in large trees (e.g. on network file systems). Files are
+          found with a quick scan for 'source' statements, and files that the
+          scan can't predict (e.g. ones sourced through preprocessor
+          variables) are read as usual when parsing reaches them. Has no
+          effect on Python 2.
+
+        lazy_help (default: False):
+          True if help texts should not be kept in memory. Only the location
+          of each help text is stored, and MenuNode.help reads it back from
+          the Kconfig file when accessed. The Kconfig files must then stay
+          unchanged for as long as help texts are accessed.
+
+        profile (default: False):
+          True if Kconfig.profile should record the time spent in each phase
+          of parsing, each Kconfig file, and each $(shell,...) command. Also
+          enabled by setting the KCONFIG_PROFILE environment variable to 'y'.
+          Timing adds a small overhead to parsing.
+
+        shell_cache (default: None):
+          An object that remembers the output of $(shell,...) commands, to
+          avoid running them again. It needs a get(command, cwd) method that
+          returns the remembered output (or None), and a set(command, cwd,
+          output) method. Only commands that succeed without writing to
+          stderr are remembered. Useful for commands like toolchain version
+          probes, whose output rarely changes. kconfigcache.ShellCache is a
+          persistent implementation.
+
+        progress (default: None):
+          A function called as progress(kconf, phase) while parsing, to
+          report how far it got. 'phase' is "parse" each time a Kconfig file
+          is entered (len(kconf.kconfig_filenames) files so far), and the
+          name of each initialization phase as it completes ("parse",
+          "finalize_tree", etc., as in Kconfig.profile). Exceptions raised
+          by the function abort the parsing, which can be used for
+          cancellation. Not kept after __init__() returns.
         """
+        if profile or os.getenv("KCONFIG_PROFILE") == "y":
+            self.profile = {"phases": {}, "files": {}, "shell": {}}
+        else:
+            self.profile = None
+        start = _clock()
+
         self.srctree = os.getenv("srctree", "")
         # A prefix we can reliably strip from glob() results to get a filename
         # relative to $srctree. relpath() can cause issues for symlinks,
@@ -912,11 +1004,6 @@ class Kconfig(object):
 
         self.config_prefix = os.getenv("CONFIG_", "CONFIG_")
 
-        # Regular expressions for parsing .config files
-        self._set_match = _re_match(self.config_prefix + r"([^=]+)=(.*)")
-        self._unset_match = \
-            _re_match(r"# {}([^ ]+) is not set".format(self.config_prefix))
-
 
         self.warnings = []
 
@@ -1010,6 +1097,14 @@ class Kconfig(object):
         self.kconfig_filenames = [filename]
         self.env_vars = set()
 
+        # (<absolute glob pattern>, <sorted matches>) for each 'source'
+        # statement. Not used internally. Lets snapshot caches detect files
+        # that appear or disappear under a glob.
+        self._source_globs = []
+
+        # Hash-consing table for expressions, see _make_expr()
+        self._exprs = {}
+
         # Used to avoid retokenizing lines when we discover that they're not
         # part of the construct currently being parsed. This is kinda like an
         # unget operation.
@@ -1024,9 +1119,31 @@ class Kconfig(object):
         self._filename = filename
         self._linenr = 0
 
+        # Tokens of already seen lines, see _tokenize()
+        self._token_memo = {}
+
+        self._lazy_help = lazy_help
+
+        self._shell_cache = shell_cache
+
+        self._progress = progress
+
+        # Absolute path -> contents of Kconfig files read ahead of parsing.
+        # See _prefetch().
+        self._prefetched = {}
+        if prefetch and not _IS_PY2:
+            self._prefetch(join(self.srctree, filename))
+            start = self._profile_phase("prefetch", start)
+
         # Open the top-level Kconfig file. Store the readline() method directly
         # as a small optimization.
-        self._readline = self._open(join(self.srctree, filename), "r").readline
+        self._readline = self._open_kconfig(join(self.srctree, filename)).readline
+
+        # [<start time>, <time spent in sourced files>] for each file being
+        # parsed, when profiling. See _enter_file().
+        self._profile_stack = []
+        if self.profile is not None:
+            self._profile_stack.append([_clock(), 0.0])
 
         try:
             # Parse everything
@@ -1034,10 +1151,20 @@ class Kconfig(object):
         except UnicodeDecodeError as e:
             _decoding_error(e, self._filename)
 
+        if self.profile is not None:
+            self._profile_file(filename)
+
         # Close the top-level Kconfig file. __self__ fetches the 'file' object
         # for the method.
         self._readline.__self__.close()
 
+        # Drop files that were read ahead but never sourced
+        self._prefetched = {}
+
+        # Lines tokenized from now on (in eval_string()) must not register new
+        # symbols, so they can't be reused
+        self._token_memo = None
+
         self.top_node.list = self.top_node.next
         self.top_node.next = None
 
@@ -1046,13 +1173,19 @@ class Kconfig(object):
         self.unique_defined_syms = _ordered_unique(self.defined_syms)
         self.unique_choices = _ordered_unique(self.choices)
 
+        start = self._profile_phase("parse", start)
+
         # Do various post-processing on the menu tree
         self._finalize_tree(self.top_node, self.y)
 
+        start = self._profile_phase("finalize_tree", start)
+
 
         # Do sanity checks. Some of these depend on everything being finalized.
         self._check_sym_sanity()
+        start = self._profile_phase("check_sym_sanity", start)
         self._check_choice_sanity()
+        start = self._profile_phase("check_choice_sanity", start)
 
         # KCONFIG_STRICT is an older alias for KCONFIG_WARN_UNDEF, supported
         # for backwards compatibility
@@ -1060,23 +1193,56 @@ class Kconfig(object):
            os.getenv("KCONFIG_STRICT") == "y":
 
             self._check_undef_syms()
+            start = self._profile_phase("check_undef_syms", start)
 
 
         # Build Symbol._dependents for all symbols and choices
         self._build_dep()
+        start = self._profile_phase("build_dep", start)
 
         # Check for dependency loops
         check_dep_loop_sym = _check_dep_loop_sym  # Micro-optimization
         for sym in self.unique_defined_syms:
             check_dep_loop_sym(sym, False)
+        start = self._profile_phase("check_dep_loop", start,
+                                    len(self.unique_defined_syms))
 
         # Add extra dependencies from choices to choice symbols that get
         # awkward during dependency loop detection
         self._add_choice_deps()
+        self._profile_phase("add_choice_deps", start)
 
 
         self._warn_no_prompt = True
 
+        # The keys of the expression table are object ids, which don't survive
+        # pickling. The expressions themselves stay shared after clearing it.
+        self._exprs.clear()
+
+        # Only a dict while set_value_delta()/unset_value_delta() runs
+        self._old_states = None
+
+        # Only a set within batch()
+        self._deferred = None
+
+        # _value_gen is incremented whenever symbol values might have changed.
+        # _written maps output files to the _value_gen they were last written
+        # (or found up to date) at, see _up_to_date().
+        self._value_gen = 0
+        self._written = {}
+
+        # config_prefix that the cached Symbol.config_string and autoconf.h
+        # lines were made with, see _check_str_prefix()
+        self._str_prefix = None
+
+        # _value_gen at the last evaluate_shallow(), when all values were
+        # cached, and the order it uses (built on the first call)
+        self._eval_gen = None
+        self._eval_order = None
+
+        # Only needed while parsing, and might not be picklable
+        self._progress = None
+
         self.mainmenu_text = self.top_node.prompt[0]
 
     @property
@@ -1185,7 +1351,8 @@ class Kconfig(object):
 
         # This stub only exists to make sure _warn_no_prompt gets reenabled
         try:
-            self._load_config(filename, replace)
+            with self.batch():
+                self._load_config(filename, replace)
         except UnicodeDecodeError as e:
             _decoding_error(e, filename)
         finally:
@@ -1210,27 +1377,25 @@ class Kconfig(object):
                 for choice in self.unique_choices:
                     choice._was_set = False
 
-            # Small optimizations
-            set_match = self._set_match
-            unset_match = self._unset_match
+            # Small optimization
             syms = self.syms
 
-            for linenr, line in enumerate(f, 1):
-                # The C tools ignore trailing whitespace
-                line = line.rstrip()
+            for linenr, kind, name, val in \
+                    config_lines(f, self.config_prefix):
 
-                match = set_match(line)
-                if match:
-                    name, val = match.groups()
-                    if name not in syms:
-                        self._undef_assign(name, val, filename, linenr)
-                        continue
+                if kind is LINE_MALFORMED:
+                    # Lines that are not assignments, and that are not blank
+                    # lines or comments
+                    self._warn("ignoring malformed line '{}'".format(name),
+                               filename, linenr)
+                    continue
 
-                    sym = syms[name]
-                    if not sym.nodes:
-                        self._undef_assign(name, val, filename, linenr)
-                        continue
+                sym = syms.get(name)
+                if sym is None or not sym.nodes:
+                    self._undef_assign(name, val, filename, linenr)
+                    continue
 
+                if kind is LINE_SET:
                     if sym.orig_type in _BOOL_TRISTATE:
                         # The C implementation only checks the first character
                         # to the right of '=', for whatever reason
@@ -1274,34 +1439,10 @@ class Kconfig(object):
 
                         val = unescape(match.group(1))
 
-                else:
-                    match = unset_match(line)
-                    if not match:
-                        # Print a warning for lines that match neither
-                        # set_match() nor unset_match() and that are not blank
-                        # lines or comments. 'line' has already been
-                        # rstrip()'d, so blank lines show up as "" here.
-                        if line and not line.lstrip().startswith("#"):
-                            self._warn("ignoring malformed line '{}'"
-                                       .format(line),
-                                       filename, linenr)
-
-                        continue
-
-                    name = match.group(1)
-                    if name not in syms:
-                        self._undef_assign(name, "n", filename, linenr)
-                        continue
-
-                    sym = syms[name]
-                    if not sym.nodes:
-                        self._undef_assign(name, "n", filename, linenr)
-                        continue
-
-                    if sym.orig_type not in _BOOL_TRISTATE:
-                        continue
-
-                    val = "n"
+                elif sym.orig_type not in _BOOL_TRISTATE:
+                    # '# CONFIG_FOO is not set' only affects bool and
+                    # tristate symbols
+                    continue
 
                 # Done parsing the assignment. Set the value.
 
@@ -1368,7 +1509,10 @@ class Kconfig(object):
           would usually want it enclosed in '/* */' to make it a C comment,
           and include a final terminating newline.
         """
-        self._write_if_changed(filename, self._autoconf_contents(header))
+        key = ("autoconf", header)
+        if not self._up_to_date(filename, key):
+            self._write_if_changed(filename, self._autoconf_contents(header))
+            self._set_up_to_date(filename, key)
 
     def _autoconf_contents(self, header):
         # write_autoconf() helper. Returns the contents to write as a string,
@@ -1378,36 +1522,10 @@ class Kconfig(object):
         chunks = [header]
         add = chunks.append
 
+        # The lines are cached on the symbols until they're invalidated, so
+        # only symbols that changed since the last call are formatted again
         for sym in self.unique_defined_syms:
-            # _write_to_conf is determined when the value is calculated. This
-            # is a hidden function call due to property magic.
-            #
-            # Note: In client code, you can check if sym.config_string is empty
-            # instead, to avoid accessing the internal _write_to_conf variable
-            # (though it's likely to keep working).
-            val = sym.str_value
-            if not sym._write_to_conf:
-                continue
-
-            if sym.orig_type in _BOOL_TRISTATE:
-                if val == "y":
-                    add("#define {}{} 1\n"
-                        .format(self.config_prefix, sym.name))
-                elif val == "m":
-                    add("#define {}{}_MODULE 1\n"
-                        .format(self.config_prefix, sym.name))
-
-            elif sym.orig_type is STRING:
-                add('#define {}{} "{}"\n'
-                    .format(self.config_prefix, sym.name, escape(val)))
-
-            else:  # sym.orig_type in _INT_HEX:
-                if sym.orig_type is HEX and \
-                   not val.startswith(("0x", "0X")):
-                    val = "0x" + val
-
-                add("#define {}{} {}\n"
-                    .format(self.config_prefix, sym.name, val))
+            add(sym._autoconf_string())
 
         return "".join(chunks)
 
@@ -1472,8 +1590,13 @@ class Kconfig(object):
         if filename is None:
             filename = standard_config_filename()
 
+        key = ("config", header)
+        if self._up_to_date(filename, key):
+            return "No change to '{}'".format(filename)
+
         contents = self._config_contents(header)
         if self._contents_eq(filename, contents):
+            self._set_up_to_date(filename, key)
             return "No change to '{}'".format(filename)
 
         if save_old:
@@ -1481,6 +1604,7 @@ class Kconfig(object):
 
         with self._open(filename, "w") as f:
             f.write(contents)
+        self._set_up_to_date(filename, key)
 
         return "Configuration saved to '{}'".format(filename)
 
@@ -1582,12 +1706,18 @@ class Kconfig(object):
         meant to reduce boilerplate in tools, which can do e.g.
         print(kconf.write_min_config()).
         """
+        key = ("min_config", header)
+        if self._up_to_date(filename, key):
+            return "No change to '{}'".format(filename)
+
         contents = self._min_config_contents(header)
         if self._contents_eq(filename, contents):
+            self._set_up_to_date(filename, key)
             return "No change to '{}'".format(filename)
 
         with self._open(filename, "w") as f:
             f.write(contents)
+        self._set_up_to_date(filename, key)
 
         return "Minimal configuration saved to '{}'".format(filename)
 
@@ -1687,6 +1817,11 @@ class Kconfig(object):
         if not exists(path):
             os.mkdir(path, 0o755)
 
+        # If we wrote auto.conf and no value has changed since, no symbol can
+        # have changed either
+        if self._up_to_date(join(path, "auto.conf"), ("auto.conf",)):
+            return
+
         # Load old values from auto.conf, if any
         self._load_old_vals(path)
 
@@ -1751,14 +1886,12 @@ class Kconfig(object):
             raise
 
         with auto_conf as f:
-            for line in f:
-                match = self._set_match(line)
-                if not match:
+            for _, kind, name, val in config_lines(f, self.config_prefix):
+                if kind is not LINE_SET:
                     # We only expect CONFIG_FOO=... (and possibly a header
                     # comment) in auto.conf
                     continue
 
-                name, val = match.groups()
                 if name in self.syms:
                     sym = self.syms[name]
 
@@ -1784,9 +1917,9 @@ class Kconfig(object):
         # A separate helper function is neater than complicating write_config()
         # by passing a flag to it, plus we only need to look at symbols here.
 
-        self._write_if_changed(
-            os.path.join(path, "auto.conf"),
-            self._old_vals_contents())
+        filename = os.path.join(path, "auto.conf")
+        self._write_if_changed(filename, self._old_vals_contents())
+        self._set_up_to_date(filename, ("auto.conf",))
 
     def _old_vals_contents(self):
         # _write_old_vals() helper. Returns the contents to write as a string.
@@ -1848,6 +1981,16 @@ class Kconfig(object):
 
             yield node
 
+    def dep_graph(self):
+        """
+        Returns a DepGraph with the dependencies between all defined symbols
+        and choices, as compact arrays. See the DepGraph class documentation.
+
+        The graph is built from scratch on each call, so it's best to keep the
+        returned DepGraph around instead of calling this repeatedly.
+        """
+        return DepGraph(self)
+
     def eval_string(self, s):
         """
         Returns the tristate value of the expression 's', represented as 0, 1,
@@ -1880,6 +2023,42 @@ class Kconfig(object):
 
         return expr_value(self._expect_expr_and_eol())
 
+    def evaluate_shallow(self):
+        """
+        Calculates the values of all defined symbols and choices in dependency
+        order, so that calculating any of them recurses at most one level
+        deep. Returns nothing; the values are cached on the items as usual.
+
+        This is only a guard against deep recursion, not an optimization: it
+        is somewhat slower than letting values be calculated on first access.
+        Lazy evaluation recurses down through the uncached dependencies of
+        the item read, so reading the value at the end of a long dependency
+        chain first can hit the Python recursion limit (e.g. a chain of 600
+        'default y if <previous>' symbols). Reading values in Kconfig order,
+        as write_config() and friends do, doesn't have the problem.
+
+        Nothing calls this implicitly. Call it after load_config() or
+        unset_values() if values might be read out of Kconfig order on
+        configurations with long dependency chains. It returns immediately if
+        no value has been invalidated since the last call.
+        """
+        if self._eval_gen == self._value_gen:
+            return
+
+        if self._eval_order is None:
+            self._build_eval_order()
+
+        for item in self._eval_order:
+            # Symbol.str_value calculates tri_value and visibility as
+            # well. Choice.selection calculates tri_value and visibility,
+            # and the visibility of the choice symbols.
+            if item.__class__ is Symbol:
+                item.str_value
+            else:
+                item.selection
+
+        self._eval_gen = self._value_gen
+
     def unset_values(self):
         """
         Removes any user values from all symbols, as if Kconfig.load_config()
@@ -1887,17 +2066,98 @@ class Kconfig(object):
         """
         self._warn_no_prompt = False
         try:
-            # set_value() already rejects undefined symbols, and they don't
-            # need to be invalidated (because their value never changes), so we
-            # can just iterate over defined symbols
-            for sym in self.unique_defined_syms:
-                sym.unset_value()
+            with self.batch():
+                # set_value() already rejects undefined symbols, and they don't
+                # need to be invalidated (because their value never changes),
+                # so we can just iterate over defined symbols
+                for sym in self.unique_defined_syms:
+                    sym.unset_value()
 
-            for choice in self.unique_choices:
-                choice.unset_value()
+                for choice in self.unique_choices:
+                    choice.unset_value()
         finally:
             self._warn_no_prompt = True
 
+    @contextmanager
+    def batch(self):
+        """
+        Context manager that defers the recalculation of dependent symbols
+        while many user values are set:
+
+          with kconf.batch():
+              for name, val in values:
+                  kconf.syms[name].set_value(val)
+
+        Within the block, Symbol/Choice.set_value() and unset_value() only
+        store the user value. The items whose user value changed are
+        invalidated together when the block is left, so items that depend on
+        several of them are only visited once.
+
+        Values, visibilities, etc., read within the block might not reflect
+        the assignments made so far. set_value_delta() and unset_value_delta()
+        can't be used within the block. Nested batch() blocks are merged into
+        the outermost one.
+
+        load_config() and unset_values() use batch() internally.
+        """
+        if self._deferred is not None:
+            # Nested, the outermost block invalidates
+            yield
+            return
+
+        self._deferred = deferred = set()
+        try:
+            yield
+        finally:
+            self._deferred = None
+            if deferred:
+                self._value_gen += 1
+            for sc in deferred:
+                sc._rec_invalidate()
+
+    def set_values(self, values):
+        """
+        Sets many user values at once, within a batch(). 'values' is a dict
+        that maps Symbols, Choices, or symbol names to values, as passed to
+        Symbol/Choice.set_value(). Symbol names must be in Kconfig.syms.
+
+        Returns True if all values are valid for the types of their items, and
+        False otherwise (see Symbol.set_value()).
+        """
+        ok = True
+        with self.batch():
+            for item, value in values.items():
+                if item.__class__ is str:
+                    item = self.syms[item]
+                if not item.set_value(value):
+                    ok = False
+
+        return ok
+
+    def set_value_delta(self, item, value):
+        """
+        Calls set_value() on the Symbol or Choice 'item' and returns a list of
+        the symbols and choices whose value, visibility, or assignability
+        changed as a result. For choices, a change of the selection is
+        reported as well.
+
+        Only the items invalidated by the assignment are looked at, so this is
+        about as cheap as set_value() itself. Values that had never been
+        calculated before the call have nothing to be compared against, and
+        aren't reported. Evaluating the whole configuration once (e.g. by
+        writing it out) beforehand makes the delta cover every item.
+
+        The returned list is empty if nothing changed, including when 'value'
+        is invalid for the type of 'item'.
+        """
+        return self._track_changes(item, item.set_value, value)
+
+    def unset_value_delta(self, item):
+        """
+        Like set_value_delta(), but calls unset_value() on 'item'.
+        """
+        return self._track_changes(item, item.unset_value)
+
     def enable_warnings(self):
         """
         Do 'Kconfig.warn = True' instead. Maintained for backwards
@@ -2027,6 +2287,43 @@ class Kconfig(object):
                            "set to '{}'".format(self.srctree) if self.srctree
                                else "unset or blank"))
 
+    def _profile_add(self, kind, name, elapsed, calls=1):
+        # Adds 'elapsed' seconds and 'calls' calls to entry 'name' in
+        # self.profile[kind]. Returns the entry.
+
+        entry = self.profile[kind].get(name)
+        if entry is None:
+            entry = self.profile[kind][name] = {"time": 0.0, "calls": 0}
+        entry["time"] += elapsed
+        entry["calls"] += calls
+        return entry
+
+    def _profile_phase(self, name, start, calls=1):
+        # Called when the initialization phase 'name' completes. Records the
+        # time since 'start' for it, if profiling, and reports the progress.
+        # Returns the start time for the next phase.
+
+        if self._progress is not None:
+            self._progress(self, name)
+
+        if self.profile is None:
+            return None
+
+        now = _clock()
+        self._profile_add("phases", name, now - start, calls)
+        return now
+
+    def _profile_file(self, filename):
+        # Records the time spent in the Kconfig file being left, both in total
+        # and excluding the files it sourced
+
+        start, sourced = self._profile_stack.pop()
+        elapsed = _clock() - start
+        entry = self._profile_add("files", filename, elapsed)
+        entry["self"] = entry.get("self", 0.0) + elapsed - sourced
+        if self._profile_stack:
+            self._profile_stack[-1][1] += elapsed
+
     def _enter_file(self, filename):
         # Jumps to the beginning of a sourced Kconfig file, saving the previous
         # position and file object.
@@ -2045,8 +2342,15 @@ class Kconfig(object):
             # Absolute path
             rel_filename = filename
 
+        # Files sourced more than once (and their include paths, via
+        # _include_path) share one filename string
+        rel_filename = _intern(rel_filename)
+
         self.kconfig_filenames.append(rel_filename)
 
+        if self._progress is not None:
+            self._progress(self, "parse")
+
         # The parent Kconfig files are represented as a list of
         # (<include path>, <Python 'file' object for Kconfig file>) tuples.
         #
@@ -2079,7 +2383,7 @@ class Kconfig(object):
                                       for name, linenr in self._include_path)))
 
         try:
-            self._readline = self._open(filename, "r").readline
+            self._readline = self._open_kconfig(filename).readline
         except IOError as e:
             # We already know that the file exists
             raise _KconfigIOError(
@@ -2091,10 +2395,16 @@ class Kconfig(object):
         self._filename = rel_filename
         self._linenr = 0
 
+        if self.profile is not None:
+            self._profile_stack.append([_clock(), 0.0])
+
     def _leave_file(self):
         # Returns from a Kconfig file to the file that sourced it. See
         # _enter_file().
 
+        if self.profile is not None:
+            self._profile_file(self._filename)
+
         # __self__ fetches the 'file' object for the method
         self._readline.__self__.close()
         # Restore location from parent Kconfig file
@@ -2165,6 +2475,56 @@ class Kconfig(object):
             with self._open(filename, "w") as f:
                 f.write(contents)
 
+    def _up_to_date(self, filename, key):
+        # Returns True if 'filename' was written (or found to be up to date)
+        # with the output identified by 'key' (the kind of file and its
+        # header), no symbol value has changed since, and the file hasn't been
+        # modified by anyone else. This avoids generating the contents and
+        # reading the file back when nothing changed.
+
+        # config_prefix is a public attribute, so the output also depends on
+        # it
+        written = self._written.get(os.path.abspath(filename))
+        if written is None or written[0] != (key, self.config_prefix) or \
+           written[1] != self._value_gen:
+            return False
+
+        try:
+            file_id = _file_id(filename)
+        except OSError:
+            return False
+        if written[2] != file_id:
+            return False
+
+        # If the file was recorded within a timestamp tick of its mtime, it
+        # might have been replaced in the same tick with the same size
+        # without the mtime changing (coarse timestamps, e.g. on FAT). Such
+        # records aren't trusted, and the caller compares the contents
+        # instead, which records the file again.
+        return written[3] - file_id[2] > _MTIME_TICK
+
+    def _set_up_to_date(self, filename, key):
+        # Records that 'filename' now has the contents identified by 'key'. See
+        # _up_to_date().
+
+        filename = os.path.abspath(filename)
+        try:
+            self._written[filename] = ((key, self.config_prefix),
+                                       self._value_gen, _file_id(filename),
+                                       _mtime_now())
+        except OSError:
+            self._written.pop(filename, None)
+
+    def _check_str_prefix(self):
+        # Drops the cached Symbol.config_string and autoconf.h lines of all
+        # symbols if config_prefix has been changed since they were made
+
+        if self._str_prefix != self.config_prefix:
+            if self._str_prefix is not None:
+                for sym in self.syms.values():
+                    sym._cached_config_str = sym._cached_autoconf_str = None
+            self._str_prefix = self.config_prefix
+
     def _contents_eq(self, filename, contents):
         # Returns True if the contents of 'filename' is 'contents' (a string),
         # and False otherwise (including if 'filename' can't be opened/read)
@@ -2225,6 +2585,37 @@ class Kconfig(object):
         # Parses 's', returning a None-terminated list of tokens. Registers any
         # new symbols encountered with _lookup(_const)_sym().
         #
+        # While parsing, lines without '$' always give the same tokens, so
+        # lines like 'bool' and 'default n' that appear over and over are
+        # looked up in _token_memo instead of being tokenized again. Token
+        # lists are never modified by the parser, so they can be shared.
+
+        memo = self._token_memo
+        if memo is None or "$" in s:
+            return self._tokenize_line(s)
+
+        tokens = memo.get(s)
+        if tokens is not None:
+            self._line = s  # Used for error reporting
+            return tokens
+
+        tokens = self._tokenize_line(s)
+
+        # (None,) is also returned for preprocessor assignments, which must
+        # be done each time. Lines with unquoted strings are tokenized each
+        # time too, so that their style warning is generated (with the right
+        # location) regardless of what was cached.
+        if tokens[0] is not None and \
+           ('"' in s or "'" in s or
+            not any(token.__class__ is str for token in tokens)):
+
+            memo[s] = tokens
+
+        return tokens
+
+    def _tokenize_line(self, s):
+        # Worker for _tokenize(). Does the actual tokenization.
+        #
         # Tries to be reasonably speedy by processing chunks of text via
         # regexes and string operations where possible. This is the biggest
         # hotspot during parsing.
@@ -2743,6 +3134,24 @@ class Kconfig(object):
     # Parsing
     #
 
+    def _make_expr(self, op, e1, e2=None):
+        # Returns the expression (op, e1, e2), or (op, e1) for NOT, reusing an
+        # existing tuple if an identical expression has been made before.
+        #
+        # Operands are always made by this function too (or are symbols and
+        # choices), so structurally equal operands are the same object, and
+        # comparing ids is enough. Conditions that are repeated in many places
+        # (e.g. the same 'depends on' on each symbol in a file) then share a
+        # single subtree, which saves memory and lets exporters de-duplicate
+        # expressions by identity.
+
+        key = (op, id(e1), id(e2))
+        expr = self._exprs.get(key)
+        if expr is None:
+            expr = self._exprs[key] = \
+                (op, e1) if e2 is None else (op, e1, e2)
+        return expr
+
     def _make_and(self, e1, e2):
         # Constructs an AND (&&) expression. Performs trivial simplification.
 
@@ -2755,7 +3164,7 @@ class Kconfig(object):
         if e1 is self.n or e2 is self.n:
             return self.n
 
-        return (AND, e1, e2)
+        return self._make_expr(AND, e1, e2)
 
     def _make_or(self, e1, e2):
         # Constructs an OR (||) expression. Performs trivial simplification.
@@ -2769,7 +3178,7 @@ class Kconfig(object):
         if e1 is self.y or e2 is self.y:
             return self.y
 
-        return (OR, e1, e2)
+        return self._make_expr(OR, e1, e2)
 
     def _parse_block(self, end_token, parent, prev):
         # Parses a block, which is the contents of either a file or an if,
@@ -2813,7 +3222,7 @@ class Kconfig(object):
                 node.kconfig = self
                 node.item = sym
                 node.is_menuconfig = (t0 is _T_MENUCONFIG)
-                node.prompt = node.help = node.list = None
+                node.prompt = node._help = node.list = None
                 node.parent = parent
                 node.filename = self._filename
                 node.linenr = self._linenr
@@ -2855,6 +3264,8 @@ class Kconfig(object):
                 #   Kconfig symbols, which indirectly ensures a consistent
                 #   ordering in e.g. .config files
                 filenames = sorted(iglob(join(self._srctree_prefix, pattern)))
+                self._source_globs.append(
+                    (join(self._srctree_prefix, pattern), filenames))
 
                 if not filenames and t0 in _OBL_SOURCE_TOKENS:
                     raise KconfigError(
@@ -2953,7 +3364,7 @@ class Kconfig(object):
                 node.kconfig = self
                 node.item = choice
                 node.is_menuconfig = True
-                node.prompt = node.help = None
+                node.prompt = node._help = None
                 node.parent = parent
                 node.filename = self._filename
                 node.linenr = self._linenr
@@ -3047,35 +3458,35 @@ class Kconfig(object):
                 if node.item.__class__ is not Symbol:
                     self._parse_error("only symbols can select")
 
-                node.selects.append((self._expect_nonconst_sym(),
-                                     self._parse_cond()))
+                node.selects += ((self._expect_nonconst_sym(),
+                                  self._parse_cond()),)
 
             elif t0 is None:
                 # Blank line
                 continue
 
             elif t0 is _T_DEFAULT:
-                node.defaults.append((self._parse_expr(False),
-                                      self._parse_cond()))
+                node.defaults += ((self._parse_expr(False),
+                                   self._parse_cond()),)
 
             elif t0 in _DEF_TOKEN_TO_TYPE:
                 self._set_type(node, _DEF_TOKEN_TO_TYPE[t0])
-                node.defaults.append((self._parse_expr(False),
-                                      self._parse_cond()))
+                node.defaults += ((self._parse_expr(False),
+                                   self._parse_cond()),)
 
             elif t0 is _T_PROMPT:
                 self._parse_prompt(node)
 
             elif t0 is _T_RANGE:
-                node.ranges.append((self._expect_sym(), self._expect_sym(),
-                                    self._parse_cond()))
+                node.ranges += ((self._expect_sym(), self._expect_sym(),
+                                 self._parse_cond()),)
 
             elif t0 is _T_IMPLY:
                 if node.item.__class__ is not Symbol:
                     self._parse_error("only symbols can imply")
 
-                node.implies.append((self._expect_nonconst_sym(),
-                                     self._parse_cond()))
+                node.implies += ((self._expect_nonconst_sym(),
+                                  self._parse_cond()),)
 
             elif t0 is _T_VISIBLE:
                 if not self._check_token(_T_IF):
@@ -3093,9 +3504,9 @@ class Kconfig(object):
                     node.item.env_var = env_var
 
                     if env_var in os.environ:
-                        node.defaults.append(
+                        node.defaults += (
                             (self._lookup_const_sym(os.environ[env_var]),
-                             self.y))
+                             self.y),)
                     else:
                         self._warn("{1} has 'option env=\"{0}\"', "
                                    "but the environment variable {0} is not "
@@ -3196,68 +3607,37 @@ class Kconfig(object):
         node.prompt = (prompt, self._parse_cond())
 
     def _parse_help(self, node):
-        if node.help is not None:
+        if node._help is not None:
             self._warn(_name_and_loc(node.item) + " defined with more than "
                        "one help text -- only the last one will be used")
 
-        # Micro-optimization. This code is pretty hot.
-        readline = self._readline
-
-        # Find first non-blank (not all-space) line and get its
-        # indentation
+        # Line number of the 'help' line
+        linenr = self._linenr
 
-        while 1:
-            line = readline()
-            self._linenr += 1
-            if not line:
-                self._empty_help(node, line)
-                return
-            if not line.isspace():
-                break
-
-        len_ = len  # Micro-optimization
+        help, nlines, line = _read_help(self._readline)
+        self._linenr += nlines
 
-        # Use a separate 'expline' variable here and below to avoid stomping on
-        # any tabs people might've put deliberately into the first line after
-        # the help text
-        expline = line.expandtabs()
-        indent = len_(expline) - len_(expline.lstrip())
-        if not indent:
-            self._empty_help(node, line)
-            return
-
-        # The help text goes on till the first non-blank line with less indent
-        # than the first line
-
-        # Add the first line
-        lines = [expline[indent:]]
-        add_line = lines.append  # Micro-optimization
-
-        while 1:
-            line = readline()
-            if line.isspace():
-                # No need to preserve the exact whitespace in these
-                add_line("\n")
-            elif not line:
-                # End of file
-                break
-            else:
-                expline = line.expandtabs()
-                if len_(expline) - len_(expline.lstrip()) < indent:
-                    break
-                add_line(expline[indent:])
+        if help is None:
+            self._warn(_name_and_loc(node.item) +
+                       " has 'help' but empty help text")
+            node._help = ""
+        elif self._lazy_help:
+            # See MenuNode.help
+            node._help = (self._filename, linenr)
+        else:
+            node._help = help
 
-        self._linenr += len_(lines)
-        node.help = "".join(lines).rstrip()
         if line:
             self._line_after_help(line)
 
-    def _empty_help(self, node, line):
-        self._warn(_name_and_loc(node.item) +
-                   " has 'help' but empty help text")
-        node.help = ""
-        if line:
-            self._line_after_help(line)
+    def _load_help(self, filename, linenr):
+        # Reads back the help text after line 'linenr' in 'filename', for
+        # MenuNode.help with lazy_help
+
+        with self._open(join(self._srctree_prefix, filename), "r") as f:
+            for _ in range(linenr):
+                f.readline()
+            return _read_help(f.readline)[0]
 
     def _parse_expr(self, transform_m):
         # Parses an expression from the tokens in Kconfig._tokens using a
@@ -3299,7 +3679,7 @@ class Kconfig(object):
         # This turns A || B || C || D into (OR, A, (OR, B, (OR, C, D))).
         return and_expr \
                if not self._check_token(_T_OR) else \
-               (OR, and_expr, self._parse_expr(transform_m))
+               self._make_expr(OR, and_expr, self._parse_expr(transform_m))
 
     def _parse_and_expr(self, transform_m):
         factor = self._parse_factor(transform_m)
@@ -3309,7 +3689,8 @@ class Kconfig(object):
         # A && B && C && D into (AND, A, (AND, B, (AND, C, D))).
         return factor \
                if not self._check_token(_T_AND) else \
-               (AND, factor, self._parse_and_expr(transform_m))
+               self._make_expr(AND, factor,
+                               self._parse_and_expr(transform_m))
 
     def _parse_factor(self, transform_m):
         token = self._tokens[self._tokens_i]
@@ -3324,7 +3705,7 @@ class Kconfig(object):
                 # For conditional expressions ('depends on <expr>',
                 # '... if <expr>', etc.), m is rewritten to m && MODULES.
                 if transform_m and token is self.m:
-                    return (AND, self.m, self.modules)
+                    return self._make_expr(AND, self.m, self.modules)
 
                 return token
 
@@ -3333,12 +3714,12 @@ class Kconfig(object):
             # _T_EQUAL, _T_UNEQUAL, etc., deliberately have the same values as
             # EQUAL, UNEQUAL, etc., so we can just use the token directly
             self._tokens_i += 1
-            return (self._tokens[self._tokens_i - 1], token,
-                    self._expect_sym())
+            return self._make_expr(self._tokens[self._tokens_i - 1], token,
+                                   self._expect_sym())
 
         if token is _T_NOT:
             # token == _T_NOT == NOT
-            return (token, self._parse_factor(transform_m))
+            return self._make_expr(token, self._parse_factor(transform_m))
 
         if token is _T_OPEN_PAREN:
             expr_parse = self._parse_expr(transform_m)
@@ -3412,6 +3793,45 @@ class Kconfig(object):
             for _, cond in choice.defaults:
                 make_depend_on(choice, cond)
 
+    def _build_eval_order(self):
+        # Sorts the defined symbols and choices topologically on the
+        # _dependents graph, so that items come after everything they depend
+        # on. Used by evaluate_shallow().
+        #
+        # _check_dep_loop_sym() has already rejected dependency loops, except
+        # for the choice symbol -> choice dependencies added by
+        # _add_choice_deps(), which are skipped here (see _eval_dependents()).
+        # The modules symbol goes first, as the type of every tristate symbol
+        # depends on it without that being in the graph.
+
+        items = self.unique_defined_syms + self.unique_choices
+
+        n_deps = dict.fromkeys(items, 0)
+        for item in items:
+            for dep in _eval_dependents(item):
+                n_deps[dep] += 1
+
+        # Items with no dependencies left, in Kconfig order. Reversed so that
+        # pop() takes from the front.
+        ready = [item for item in items if not n_deps[item]]
+        ready.reverse()
+
+        order = []
+        if self.modules in n_deps:
+            order.append(self.modules)
+
+        while ready:
+            item = ready.pop()
+            if item is not self.modules:
+                order.append(item)
+
+            for dep in _eval_dependents(item):
+                n_deps[dep] -= 1
+                if not n_deps[dep]:
+                    ready.append(dep)
+
+        self._eval_order = order
+
     def _add_choice_deps(self):
         # Choices also depend on the choice symbols themselves, because the
         # y-mode selection of the choice might change if a choice symbol's
@@ -3426,10 +3846,82 @@ class Kconfig(object):
             for sym in choice.syms:
                 sym._dependents.add(choice)
 
+    def _track_changes(self, item, fn, *args):
+        # Worker for set_value_delta() and unset_value_delta(). Symbol and
+        # Choice _invalidate() save the cached values of each item in
+        # _old_states, and these are compared against the new values.
+
+        if self._deferred is not None:
+            raise KconfigError("set_value_delta() and unset_value_delta() "
+                               "can't be used within Kconfig.batch()")
+
+        # A choice's mode isn't cached, so remember what it's derived from
+        old_user_value = item.user_value if item.__class__ is Choice else None
+        old_modules = self.modules.tri_value
+
+        self._old_states = {}
+        try:
+            fn(*args)
+            old_states = self._old_states
+        finally:
+            self._old_states = None
+
+        changed = []
+        for sc, old in old_states.items():
+            if sc.__class__ is Symbol:
+                old_str, old_tri, old_vis, old_assignable = old
+
+                if old_vis is None:
+                    # Nothing was calculated for the symbol
+                    continue
+
+                if old_vis != sc.visibility or \
+                   old_assignable is not None and \
+                       old_assignable != sc.assignable or \
+                   old_str is not None and old_str != sc.str_value or \
+                   old_str is None and old_tri is not None and \
+                       old_tri != sc.tri_value:
+                    changed.append(sc)
+
+            else:
+                old_vis, old_assignable, old_selection = old
+
+                if old_vis is None:
+                    continue
+
+                # Same calculation as Choice.tri_value
+                old_tri = 0 if sc.is_optional else 1
+                user_value = old_user_value if sc is item else sc.user_value
+                if user_value is not None:
+                    old_tri = max(old_tri, user_value)
+                old_tri = min(old_tri, old_vis)
+                if old_tri == 1 and (sc.orig_type is BOOL or not old_modules):
+                    old_tri = 2
+
+                if old_vis != sc.visibility or old_tri != sc.tri_value or \
+                   old_assignable is not None and \
+                       old_assignable != sc.assignable or \
+                   old_selection is not _NO_CACHED_SELECTION and \
+                       old_selection is not sc.selection:
+                    changed.append(sc)
+
+        return changed
+
+    def _invalidate_user(self, sc):
+        # Invalidates the Symbol or Choice 'sc' and its dependents after a
+        # change to its user value, or queues it during batch()
+
+        if self._deferred is None:
+            self._value_gen += 1
+            sc._rec_invalidate()
+        else:
+            self._deferred.add(sc)
+
     def _invalidate_all(self):
         # Undefined symbols never change value and don't need to be
         # invalidated, so we can just iterate over defined symbols.
         # Invalidating constant symbols would break things horribly.
+        self._value_gen += 1
         for sym in self.unique_defined_syms:
             sym._invalidate()
 
@@ -3545,23 +4037,23 @@ class Kconfig(object):
 
                 # Propagate dependencies to defaults
                 if cur.defaults:
-                    cur.defaults = [(default, self._make_and(cond, dep))
-                                    for default, cond in cur.defaults]
+                    cur.defaults = tuple([(default, self._make_and(cond, dep))
+                                          for default, cond in cur.defaults])
 
                 # Propagate dependencies to ranges
                 if cur.ranges:
-                    cur.ranges = [(low, high, self._make_and(cond, dep))
-                                  for low, high, cond in cur.ranges]
+                    cur.ranges = tuple([(low, high, self._make_and(cond, dep))
+                                        for low, high, cond in cur.ranges])
 
                 # Propagate dependencies to selects
                 if cur.selects:
-                    cur.selects = [(target, self._make_and(cond, dep))
-                                   for target, cond in cur.selects]
+                    cur.selects = tuple([(target, self._make_and(cond, dep))
+                                         for target, cond in cur.selects])
 
                 # Propagate dependencies to implies
                 if cur.implies:
-                    cur.implies = [(target, self._make_and(cond, dep))
-                                   for target, cond in cur.implies]
+                    cur.implies = tuple([(target, self._make_and(cond, dep))
+                                         for target, cond in cur.implies])
 
             elif cur.prompt:  # Not a symbol/choice
                 # Propagate dependencies to the prompt. 'visible if' is only
@@ -3806,6 +4298,75 @@ class Kconfig(object):
         return open(filename, "rU" if mode == "r" else mode) if _IS_PY2 else \
                open(filename, mode, encoding=self._encoding, errors='ignore')
 
+    def _open_kconfig(self, filename):
+        # Opens the Kconfig file 'filename' for parsing, using the contents
+        # from _prefetch() if available
+
+        contents = self._prefetched.pop(filename, None)
+        if contents is not None:
+            return io.StringIO(contents)
+        return self._open(filename, "r")
+
+    def _prefetch(self, filename):
+        # Reads 'filename' and the Kconfig files it (recursively) sources into
+        # self._prefetched, using a thread pool. The files are read in waves,
+        # one level of 'source' nesting at a time, with all files of a level
+        # read in parallel.
+        #
+        # This is only a guess at what the parser will open: 'source'
+        # statements are found with a regex, and only environment variables
+        # are expanded in them. The parser looks files up by the same path
+        # strings, so a wrong guess only costs an unused (or missing) entry.
+
+        # Only import as needed, to save some startup time
+        from multiprocessing.pool import ThreadPool
+
+        def read(path):
+            try:
+                with self._open(path, "r") as f:
+                    return path, f.read()
+            except (IOError, OSError, UnicodeDecodeError):
+                return path, None
+
+        pool = ThreadPool(_PREFETCH_THREADS)
+        try:
+            # (<path>, <filename relative to $srctree>) pairs
+            wave = [(filename, filename)]
+            seen = {filename}
+
+            while wave:
+                rel_names = dict(wave)
+                next_wave = []
+
+                for path, contents in pool.map(read, [p for p, _ in wave]):
+                    if contents is None:
+                        continue
+                    self._prefetched[path] = contents
+
+                    for match in _source_re_finditer(contents):
+                        pattern = _prefetch_expand(match.group(3))
+                        if pattern is None:
+                            continue
+
+                        if match.group(1):
+                            # rsource/orsource
+                            pattern = join(dirname(rel_names[path]), pattern)
+
+                        for sourced in sorted(iglob(join(self._srctree_prefix,
+                                                         pattern))):
+                            if sourced not in seen:
+                                seen.add(sourced)
+                                if sourced.startswith(self._srctree_prefix):
+                                    rel = sourced[len(self._srctree_prefix):]
+                                else:
+                                    rel = sourced
+                                next_wave.append((sourced, rel))
+
+                wave = next_wave
+        finally:
+            pool.close()
+            pool.join()
+
     def _check_undef_syms(self):
         # Prints warnings for all references to undefined symbols within the
         # Kconfig files
@@ -4110,6 +4671,8 @@ class Symbol(object):
     """
     __slots__ = (
         "_cached_assignable",
+        "_cached_autoconf_str",
+        "_cached_config_str",
         "_cached_str_val",
         "_cached_tri_val",
         "_cached_vis",
@@ -4399,26 +4962,38 @@ class Symbol(object):
         """
         See the class documentation.
         """
+        # Cached until the symbol is invalidated, like the value, or
+        # config_prefix is changed
+        kconf = self.kconfig
+        if kconf._str_prefix != kconf.config_prefix:
+            kconf._check_str_prefix()
+        elif self._cached_config_str is not None:
+            return self._cached_config_str
+
         # _write_to_conf is determined when the value is calculated. This is a
         # hidden function call due to property magic.
         val = self.str_value
         if not self._write_to_conf:
-            return ""
+            res = ""
 
-        if self.orig_type in _BOOL_TRISTATE:
-            return "{}{}={}\n" \
-                   .format(self.kconfig.config_prefix, self.name, val) \
-                   if val != "n" else \
-                   "# {}{} is not set\n" \
-                   .format(self.kconfig.config_prefix, self.name)
+        elif self.orig_type in _BOOL_TRISTATE:
+            res = "{}{}={}\n" \
+                  .format(self.kconfig.config_prefix, self.name, val) \
+                  if val != "n" else \
+                  "# {}{} is not set\n" \
+                  .format(self.kconfig.config_prefix, self.name)
 
-        if self.orig_type in _INT_HEX:
-            return "{}{}={}\n" \
-                   .format(self.kconfig.config_prefix, self.name, val)
+        elif self.orig_type in _INT_HEX:
+            res = "{}{}={}\n" \
+                  .format(self.kconfig.config_prefix, self.name, val)
+
+        else:
+            # sym.orig_type is STRING
+            res = '{}{}="{}"\n' \
+                  .format(self.kconfig.config_prefix, self.name, escape(val))
 
-        # sym.orig_type is STRING
-        return '{}{}="{}"\n' \
-               .format(self.kconfig.config_prefix, self.name, escape(val))
+        self._cached_config_str = res
+        return res
 
     def set_value(self, value):
         """
@@ -4499,7 +5074,7 @@ class Symbol(object):
             # dependencies come into play.
             self.choice.user_selection = self
             self.choice._was_set = True
-            self.choice._rec_invalidate()
+            self.kconfig._invalidate_user(self.choice)
         else:
             self._rec_invalidate_if_has_prompt()
 
@@ -4631,7 +5206,8 @@ class Symbol(object):
         self.choice = \
         self.env_var = \
         self._cached_str_val = self._cached_tri_val = self._cached_vis = \
-        self._cached_assignable = None
+        self._cached_assignable = self._cached_config_str = \
+        self._cached_autoconf_str = None
 
         # _write_to_conf is calculated along with the value. If True, the
         # Symbol gets a .config entry.
@@ -4696,8 +5272,14 @@ class Symbol(object):
     def _invalidate(self):
         # Marks the symbol as needing to be recalculated
 
+        old_states = self.kconfig._old_states
+        if old_states is not None and self not in old_states:
+            old_states[self] = (self._cached_str_val, self._cached_tri_val,
+                                self._cached_vis, self._cached_assignable)
+
         self._cached_str_val = self._cached_tri_val = self._cached_vis = \
-            self._cached_assignable = None
+            self._cached_assignable = self._cached_config_str = \
+            self._cached_autoconf_str = None
 
     def _rec_invalidate(self):
         # Invalidates the symbol and all items that (possibly) depend on it
@@ -4745,13 +5327,51 @@ class Symbol(object):
 
         for node in self.nodes:
             if node.prompt:
-                self._rec_invalidate()
+                self.kconfig._invalidate_user(self)
                 return
 
         if self.kconfig._warn_no_prompt:
             self.kconfig._warn(_name_and_loc(self) + " has no prompt, meaning "
                                "user values have no effect on it")
 
+    def _autoconf_string(self):
+        # Kconfig._autoconf_contents() helper. Returns the #define for the
+        # symbol in autoconf.h, or "" if it has none. Cached like
+        # config_string.
+
+        kconf = self.kconfig
+        if kconf._str_prefix != kconf.config_prefix:
+            kconf._check_str_prefix()
+        elif self._cached_autoconf_str is not None:
+            return self._cached_autoconf_str
+
+        # _write_to_conf is determined when the value is calculated. This is a
+        # hidden function call due to property magic.
+        val = self.str_value
+        prefix = self.kconfig.config_prefix
+        res = ""
+
+        if not self._write_to_conf:
+            pass
+
+        elif self.orig_type in _BOOL_TRISTATE:
+            if val == "y":
+                res = "#define {}{} 1\n".format(prefix, self.name)
+            elif val == "m":
+                res = "#define {}{}_MODULE 1\n".format(prefix, self.name)
+
+        elif self.orig_type is STRING:
+            res = '#define {}{} "{}"\n'.format(prefix, self.name, escape(val))
+
+        else:  # self.orig_type in _INT_HEX:
+            if self.orig_type is HEX and not val.startswith(("0x", "0X")):
+                val = "0x" + val
+
+            res = "#define {}{} {}\n".format(prefix, self.name, val)
+
+        self._cached_autoconf_str = res
+        return res
+
     def _str_default(self):
         # write_min_config() helper function. Returns the value the symbol
         # would get from defaults if it didn't have a user value. Uses exactly
@@ -5095,7 +5715,7 @@ class Choice(object):
 
         self.user_value = value
         self._was_set = True
-        self._rec_invalidate()
+        self.kconfig._invalidate_user(self)
 
         return True
 
@@ -5106,7 +5726,7 @@ class Choice(object):
         """
         if self.user_value is not None or self.user_selection:
             self.user_value = self.user_selection = None
-            self._rec_invalidate()
+            self.kconfig._invalidate_user(self)
 
     @property
     def referenced(self):
@@ -5262,6 +5882,11 @@ class Choice(object):
         return None
 
     def _invalidate(self):
+        old_states = self.kconfig._old_states
+        if old_states is not None and self not in old_states:
+            old_states[self] = (self._cached_vis, self._cached_assignable,
+                                self._cached_selection)
+
         self._cached_vis = self._cached_assignable = None
         self._cached_selection = _NO_CACHED_SELECTION
 
@@ -5322,7 +5947,7 @@ class MenuNode(object):
 
     defaults:
       The 'default' properties for this particular menu node. See
-      symbol.defaults.
+      symbol.defaults. Unlike Symbol/Choice.defaults, this is a tuple.
 
       When evaluating defaults, you should use Symbol/Choice.defaults instead,
       as it include properties from all menu nodes (a symbol/choice can have
@@ -5360,6 +5985,13 @@ class MenuNode(object):
       text. This was not the case before Kconfiglib 10.21.0, where the format
       was undocumented.
 
+      With Kconfig(lazy_help=True), the help text is read from the Kconfig
+      file each time this attribute is accessed.
+
+    has_help:
+      True if the menu node has a help text (possibly empty). Unlike 'help',
+      this never reads the Kconfig file.
+
     dep:
       The direct ('depends on') dependencies for the menu node, or
       self.kconfig.y if there are no direct dependencies.
@@ -5411,6 +6043,9 @@ class MenuNode(object):
       was included. The first element is the location of the 'source' statement
       in the top-level Kconfig file passed to Kconfig.__init__(), etc.
 
+      All menu nodes from the same Kconfig file share the same tuple, and the
+      same 'filename' string.
+
       Note that the Kconfig file of the menu node itself isn't included. Check
       'filename' and 'linenr' for that.
 
@@ -5418,9 +6053,9 @@ class MenuNode(object):
       The Kconfig instance the menu node is from.
     """
     __slots__ = (
+        "_help",
         "dep",
         "filename",
-        "help",
         "include_path",
         "is_menuconfig",
         "item",
@@ -5443,10 +6078,33 @@ class MenuNode(object):
         # Properties defined on this particular menu node. A local 'depends on'
         # only applies to these, in case a symbol is defined in multiple
         # locations.
-        self.defaults = []
-        self.selects = []
-        self.implies = []
-        self.ranges = []
+        #
+        # These are tuples, so that the many nodes without a property (menus,
+        # comments, 'if's, and most symbols for selects/implies/ranges) share
+        # the empty tuple instead of each holding an empty list.
+        self.defaults = self.selects = self.implies = self.ranges = ()
+
+    @property
+    def help(self):
+        """
+        See the class documentation.
+        """
+        help = self._help
+        if help.__class__ is tuple:
+            # Location of the help text, with Kconfig(lazy_help=True)
+            return self.kconfig._load_help(*help)
+        return help
+
+    @help.setter
+    def help(self, help):
+        self._help = help
+
+    @property
+    def has_help(self):
+        """
+        See the class documentation.
+        """
+        return getattr(self, "_help", None) is not None
 
     @property
     def orig_prompt(self):
@@ -5759,6 +6417,153 @@ class Variable(object):
                        self.value)
 
 
+class DepGraph(object):
+    """
+    Dependency graph of the symbols and choices in a configuration, returned
+    by Kconfig.dep_graph(). Each item has an integer id: defined symbols come
+    first in Kconfig.unique_defined_syms order, then the choices in
+    Kconfig.unique_choices order.
+
+    The relations are stored in CSR (compressed sparse row) form. Each one is
+    an (offset, index) tuple of lists, where the ids related to the item with
+    id i are index[offset[i]:offset[i + 1]], in increasing order. This makes
+    lookups O(degree) without parsing any expressions, and the lists can be
+    serialized to JSON as is.
+
+    The following attributes are available:
+
+    items:
+      List of the Symbols and Choices, indexed by id.
+
+    ids:
+      Dictionary mapping each Symbol and Choice in 'items' to its id.
+
+    n_syms:
+      Number of symbols. Ids from n_syms on are choices.
+
+    dependents:
+      Items whose value might change when the value of the item changes,
+      i.e. the items that refer to it in their prompt conditions, defaults,
+      selects, implies, ranges, or direct dependencies. Choice symbols also
+      have the choice they're in as a dependent. This is the same graph
+      Kconfiglib uses to invalidate cached values, so it might be larger than
+      strictly necessary.
+
+    selected_by:
+      Symbols that select the symbol ('select').
+
+    implied_by:
+      Symbols that imply the symbol ('imply').
+
+    default_of:
+      Items that refer to the item in a default value or in the condition of
+      a default.
+
+    The names of the relations are listed in DepGraph.RELATIONS.
+    """
+    __slots__ = (
+        "default_of",
+        "dependents",
+        "ids",
+        "implied_by",
+        "items",
+        "n_syms",
+        "selected_by",
+    )
+
+    RELATIONS = ("dependents", "selected_by", "implied_by", "default_of")
+
+    def __init__(self, kconf):
+        self.items = items = kconf.unique_defined_syms + kconf.unique_choices
+        self.n_syms = len(kconf.unique_defined_syms)
+        self.ids = ids = {item: i for i, item in enumerate(items)}
+
+        dependents = []
+        selected_by = [set() for _ in items]
+        implied_by = [set() for _ in items]
+        default_of = [set() for _ in items]
+
+        for i, item in enumerate(items):
+            # Undefined and constant symbols don't get ids, see _build_dep()
+            dependents.append({ids[dep] for dep in item._dependents
+                               if dep in ids})
+
+            for node in item.nodes:
+                # Only defined symbols can be selected or implied
+                for target, _ in node.selects:
+                    if target in ids:
+                        selected_by[ids[target]].add(i)
+                for target, _ in node.implies:
+                    if target in ids:
+                        implied_by[ids[target]].add(i)
+
+            for default, cond in item.defaults:
+                for sc in expr_items(default) | expr_items(cond):
+                    if sc in ids:
+                        default_of[ids[sc]].add(i)
+
+        self.dependents = _csr(dependents)
+        self.selected_by = _csr(selected_by)
+        self.implied_by = _csr(implied_by)
+        self.default_of = _csr(default_of)
+
+    def id(self, item):
+        """
+        Returns the id of the Symbol or Choice 'item', or None if it is not in
+        the graph (undefined and constant symbols).
+        """
+        return self.ids.get(item)
+
+    def related(self, relation, item):
+        """
+        Returns the list of items related to 'item' by 'relation', which is
+        one of the names in DepGraph.RELATIONS. For example,
+
+          graph.related("selected_by", kconf.syms["FOO"])
+
+        returns the symbols that select FOO. Returns an empty list for items
+        that are not in the graph.
+        """
+        if relation not in DepGraph.RELATIONS:
+            raise ValueError("unknown relation '{}'".format(relation))
+
+        i = self.ids.get(item)
+        if i is None:
+            return []
+
+        offset, index = getattr(self, relation)
+        items = self.items
+        return [items[j] for j in index[offset[i]:offset[i + 1]]]
+
+    def affected(self, item):
+        """
+        Returns the set of all items whose value might change when the value
+        of 'item' changes, following 'dependents' transitively. 'item' itself
+        is not included unless it is part of a dependency loop (which happens
+        between choices and their symbols).
+        """
+        i = self.ids.get(item)
+        if i is None:
+            return set()
+
+        offset, index = self.dependents
+        seen = set()
+        stack = [i]
+        while stack:
+            i = stack.pop()
+            for j in index[offset[i]:offset[i + 1]]:
+                if j not in seen:
+                    seen.add(j)
+                    stack.append(j)
+
+        items = self.items
+        return {items[j] for j in seen}
+
+    def __repr__(self):
+        return "<dependency graph, {} symbols, {} choices>" \
+               .format(self.n_syms, len(self.items) - self.n_syms)
+
+
 class KconfigError(Exception):
     """
     Exception raised for Kconfig-related errors.
@@ -6004,6 +6809,59 @@ def unescape(s):
 _unescape_sub = re.compile(r"\\(.)").sub
 
 
+# Kinds of lines yielded by config_lines()
+LINE_SET = 0
+LINE_UNSET = 1
+LINE_MALFORMED = 2
+
+
+def config_lines(f, prefix="CONFIG_"):
+    """
+    Generator that splits a .config or defconfig file into assignments, for
+    Kconfig.load_config() and other tools reading such files. Yields a
+    (linenr, kind, name, value) tuple for each line that is not blank or a
+    comment:
+
+      LINE_SET:
+        A '<prefix>FOO=<value>' line. 'value' is the text after '=', with
+        quotes and escapes still in place for strings.
+
+      LINE_UNSET:
+        A '# <prefix>FOO is not set' line. 'value' is "n".
+
+      LINE_MALFORMED:
+        Any other line. 'name' is the line and 'value' is None.
+
+    'name' is the symbol name without the prefix. Trailing whitespace is
+    ignored, like in the C tools.
+
+    f:
+      File object to read from. The whole file is read at once, and all lines
+      are classified by a single regular expression, which is faster than
+      matching lines one by one.
+
+    prefix (default: "CONFIG_"):
+      Prefix of symbol names, usually Kconfig.config_prefix.
+    """
+    # Each line matches exactly one of the alternatives: an assignment, an
+    # "is not set" comment, a blank line or comment (no groups), or anything
+    # else
+    finditer = re.compile(
+        r"^(?:{0}([^=\n]+)=([^\n]*)"
+        r"|# {0}([^ \n]+) is not set[^\n]*"
+        r"|[^\S\n]*(?:#[^\n]*)?"
+        r"|([^\n]*))$".format(prefix), re.M).finditer
+
+    for linenr, match in enumerate(finditer(f.read()), 1):
+        name, val, unset_name, line = match.groups()
+        if name is not None:
+            yield linenr, LINE_SET, name, val.rstrip()
+        elif unset_name is not None:
+            yield linenr, LINE_UNSET, unset_name, "n"
+        elif line is not None:
+            yield linenr, LINE_MALFORMED, line.rstrip(), None
+
+
 def standard_kconfig():
     """
     Helper for tools. Loads the top-level Kconfig specified as the first
@@ -6155,6 +7013,17 @@ def _parenthesize(expr, type_, sc_expr_str_fn):
     return expr_str(expr, sc_expr_str_fn)
 
 
+def _csr(rows):
+    # Converts a list of id sets into (offset, index) lists, see DepGraph
+
+    offset = [0]
+    index = []
+    for row in rows:
+        index.extend(sorted(row))
+        offset.append(len(index))
+    return (offset, index)
+
+
 def _ordered_unique(lst):
     # Returns 'lst' with any duplicates removed, preserving order. This hacky
     # version seems to be a common idiom. It relies on short-circuit evaluation
@@ -6204,6 +7073,33 @@ def _touch_dep_file(path, sym_name):
         sym_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644))
 
 
+def _eval_dependents(item):
+    # Kconfig._build_eval_order() helper. Returns the dependents of 'item',
+    # without the choice added by Kconfig._add_choice_deps() for a choice
+    # symbol.
+
+    if item.__class__ is Symbol and item.choice is not None:
+        return [dep for dep in item._dependents if dep is not item.choice]
+    return item._dependents
+
+
+def _mtime_now():
+    # Current time in the unit of the mtime in _file_id()
+
+    return time.time() if _IS_PY2 else int(time.time() * 1e9)
+
+
+def _file_id(path):
+    # Kconfig._up_to_date() helper. Returns a tuple that changes when 'path'
+    # is modified or replaced.
+
+    st = os.stat(path)
+    # Float st_mtime can't tell apart writes close in time on filesystems
+    # with fine timestamps
+    return (st.st_ino, st.st_size,
+            st.st_mtime if _IS_PY2 else st.st_mtime_ns)
+
+
 def _save_old(path):
     # See write_config()
 
@@ -6598,12 +7494,25 @@ def _error_if_fn(kconf, _, cond, msg):
 
 
 def _shell_fn(kconf, _, command):
+    cache = kconf._shell_cache
+    if cache is not None:
+        cwd = os.getcwd()
+        output = cache.get(command, cwd)
+        if output is not None:
+            return output
+
     # Only import as needed, to save some startup time
     import subprocess
 
-    stdout, stderr = subprocess.Popen(
-        command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-    ).communicate()
+    if kconf.profile is not None:
+        start = _clock()
+
+    proc = subprocess.Popen(
+        command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = proc.communicate()
+
+    if kconf.profile is not None:
+        kconf._profile_add("shell", command, _clock() - start)
 
     if not _IS_PY2:
         try:
@@ -6624,7 +7533,88 @@ def _shell_fn(kconf, _, command):
     # On Python 3 versions before 3.6, it's not possible to specify the
     # encoding when passing universal_newlines=True to Popen() (the 'encoding'
     # parameter was added in 3.6), so we do this manual version instead.
-    return "\n".join(stdout.splitlines()).rstrip("\n").replace("\n", " ")
+    output = "\n".join(stdout.splitlines()).rstrip("\n").replace("\n", " ")
+
+    # Failing or complaining commands are run again next time, so that the
+    # warning isn't lost and transient failures aren't remembered
+    if cache is not None and not stderr and proc.returncode == 0:
+        cache.set(command, cwd, output)
+
+    return output
+
+
+def _read_help(readline):
+    # Reads a help text with 'readline', starting at the line after 'help'.
+    # Returns a (<help text>, <number of lines>, <line after help text>)
+    # tuple. The help text is None if it's empty. The line count is what the
+    # parser should add to Kconfig._linenr. The line after the help text
+    # hasn't been tokenized yet, and is "" at end of file.
+
+    # Find first non-blank (not all-space) line and get its
+    # indentation
+
+    nlines = 0
+    while 1:
+        line = readline()
+        nlines += 1
+        if not line:
+            return None, nlines, line
+        if not line.isspace():
+            break
+
+    len_ = len  # Micro-optimization
+
+    # Use a separate 'expline' variable here and below to avoid stomping on
+    # any tabs people might've put deliberately into the first line after
+    # the help text
+    expline = line.expandtabs()
+    indent = len_(expline) - len_(expline.lstrip())
+    if not indent:
+        return None, nlines, line
+
+    # The help text goes on till the first non-blank line with less indent
+    # than the first line
+
+    # Add the first line
+    lines = [expline[indent:]]
+    add_line = lines.append  # Micro-optimization
+
+    while 1:
+        line = readline()
+        if line.isspace():
+            # No need to preserve the exact whitespace in these
+            add_line("\n")
+        elif not line:
+            # End of file
+            break
+        else:
+            expline = line.expandtabs()
+            if len_(expline) - len_(expline.lstrip()) < indent:
+                break
+            add_line(expline[indent:])
+
+    return "".join(lines).rstrip(), nlines + len_(lines), line
+
+
+def _prefetch_expand(pattern):
+    # Expands environment variable references in the 'source' pattern
+    # 'pattern' for Kconfig._prefetch(), like the parser would for variables
+    # not defined in the Kconfig files. Returns None if 'pattern' uses other
+    # preprocessor features, or variables not in the environment (these might
+    # be defined in the Kconfig files, and expanding them to "" gives bogus
+    # paths).
+
+    # Unknown references are left alone, to be caught below
+    pattern = _prefetch_var_sub(
+        lambda match: os.environ.get(match.group(1), match.group(0)), pattern)
+    if "$(" in pattern:
+        return None
+
+    # Old-style $FOO references, see Kconfig._tokenize()
+    pattern = expandvars(pattern)
+    if "$" in pattern:
+        return None
+    return pattern
 
 #
 # Global constants
@@ -6650,6 +7640,17 @@ _NO_CACHED_SELECTION = 0
 # Are we running on Python 2?
 _IS_PY2 = sys.version_info[0] < 3
 
+# Timestamp granularity assumed for the racy check in Kconfig._up_to_date(),
+# in the unit of _mtime_now(). Two seconds covers FAT.
+_MTIME_TICK = 2 if _IS_PY2 else 2 * 10**9
+
+# Interns strings shared by many objects, e.g. MenuNode.filename. intern() is
+# a builtin on Python 2.
+_intern = getattr(sys, "intern", None) or intern
+
+# Clock for Kconfig.profile. time.perf_counter() is missing on Python 2.
+_clock = getattr(time, "perf_counter", time.time)
+
 try:
     _UNAME_RELEASE = os.uname()[2]
 except AttributeError:
@@ -6984,3 +7985,14 @@ _name_special_search = _re_search(r'[^$A-Za-z0-9_/.-]|\$\(|$')
 # A valid right-hand side for an assignment to a string symbol in a .config
 # file, including escaped characters. Extracts the contents.
 _conf_string_match = _re_match(r'"((?:[^\\"]|\\.)*)"')
+
+# 'source' statements, for Kconfig._prefetch(). Extracts 'r' for relative
+# sources, and the quoted pattern.
+_source_re_finditer = re.compile(
+    r'^[ \t]*o?(r?)source[ \t]+(["\'])(.*?)\2', re.MULTILINE).finditer
+
+# Simple $(FOO) references, for _prefetch_expand()
+_prefetch_var_sub = re.compile(r"\$\(([A-Za-z0-9_]+)\)").sub
+
+# Number of threads used by Kconfig._prefetch()
+_PREFETCH_THREADS = 8
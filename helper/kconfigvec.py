@@ -0,0 +1,544 @@
+############################################################################
+# helper/kconfigvec.py
+#
+#   Copyright 2026 Sony Semiconductor Solutions Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+# 3. Neither the name of Sony Semiconductor Solutions Corporation nor
+#    the names of its contributors may be used to endorse or promote
+#    products derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS
+# OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+############################################################################
+
+# Evaluate bool/tristate symbols of many configurations at once.
+#
+# Questions like "which of these defconfigs enable CXD56_SDIO?" would need
+# load_config() and a full evaluation per configuration with kconfiglib.
+# BatchEvaluator compiles the visibility, defaults, selects and implies of
+# every bool/tristate symbol and choice of a parsed Kconfig into NumPy
+# operations on rows of a (items x configurations) tristate matrix, with
+# minimum for '&&', maximum for '||' and 2 - x for '!'. The items are
+# evaluated once each in dependency order, every operation covering all the
+# configurations, e.g.
+#
+#   ev = BatchEvaluator(kconf)
+#   values = ev.evaluate(ev.load_configs(defconfigs))
+#   enabled = values.column("CXD56_SDIO") == 2
+#
+# The results match Symbol.tri_value/visibility and Choice.selection, except
+# that int, hex and string symbols are not evaluated per configuration. They
+# keep the value they have in the Kconfig object, and comparisons with them
+# ('FOO = "bar"', 'BAZ > 10') use that value.
+#
+# NumPy is only needed by this module, nothing else in the helper uses it.
+
+import sys
+import argparse
+
+import numpy as np
+
+import kconfiglib
+from kconfiglib import Choice, BOOL, TRISTATE, STRING, AND, OR, NOT, \
+                       EQUAL, UNEQUAL, LESS, LESS_EQUAL, GREATER, \
+                       GREATER_EQUAL, LINE_SET, LINE_UNSET, TRI_TO_STR, \
+                       STR_TO_TRI, config_lines
+
+_BOOL_TRISTATE = (BOOL, TRISTATE)
+
+class UserValues(object):
+    '''
+    User values of a batch of configurations, the input of
+    BatchEvaluator.evaluate(). Row r of each array is configuration r.
+
+    sym:
+      int8 array (configs x symbols), Symbol.user_value or -1 for no value.
+
+    choice:
+      int8 array (configs x choices), Choice.user_value or -1.
+
+    selection:
+      int32 array (configs x choices), symbol index of
+      Choice.user_selection or -1.
+    '''
+    def __init__(self, n_configs, n_syms, n_choices):
+        self.sym = np.full((n_configs, n_syms), -1, np.int8)
+        self.choice = np.full((n_configs, n_choices), -1, np.int8)
+        self.selection = np.full((n_configs, n_choices), -1, np.int32)
+
+    def __len__(self):
+        return self.sym.shape[0]
+
+class BatchValues(object):
+    '''
+    Result of BatchEvaluator.evaluate(). Row r of each array is configuration
+    r, like in UserValues.
+
+    tri, visibility:
+      int8 arrays (configs x symbols), Symbol.tri_value and
+      Symbol.visibility.
+
+    choice, selection:
+      Choice.tri_value (int8) and the symbol index of Choice.selection, or
+      -1 for no selection (int32), (configs x choices).
+    '''
+    def __init__(self, evaluator, tri, vis, choice, selection):
+        self._evaluator = evaluator
+        self.tri = tri
+        self.visibility = vis
+        self.choice = choice
+        self.selection = selection
+
+    def column(self, name):
+        '''Tristate values of the symbol 'name' in all configurations.'''
+        return self.tri[:, self._evaluator.sym_index[name]]
+
+class BatchEvaluator(object):
+    '''
+    Compiled form of the bool/tristate logic in 'kconf'. Symbols and choices
+    are numbered as in the 'syms' and 'choices' lists, which are in Kconfig
+    order. 'sym_index' maps symbol names to numbers.
+    '''
+    def __init__(self, kconf):
+        self.kconf = kconf
+        self.syms = [sym for sym in kconf.unique_defined_syms
+                     if sym.orig_type in _BOOL_TRISTATE]
+        self.choices = list(kconf.unique_choices)
+        self.sym_index = dict((sym.name, i) for i, sym in enumerate(self.syms))
+
+        # Rows of the value matrix: symbols first, then choices
+        n_syms = len(self.syms)
+        self._rows = dict((sym, i) for i, sym in enumerate(self.syms))
+        for i, choice in enumerate(self.choices):
+            self._rows[choice] = n_syms + i
+
+        self._steps = [self._compile_group(group)
+                       for group in self._group_order()]
+
+    #
+    # Public interface
+    #
+
+    def user_values(self, n_configs):
+        '''Returns UserValues for 'n_configs' configurations, all unset.'''
+        return UserValues(n_configs, len(self.syms), len(self.choices))
+
+    def current_user_values(self, n_configs=1):
+        '''Returns UserValues with the user values currently in the Kconfig
+        object, repeated 'n_configs' times. Handy for what-if analysis.'''
+        user = self.user_values(n_configs)
+        for i, sym in enumerate(self.syms):
+            if sym.user_value is not None:
+                user.sym[:, i] = sym.user_value
+        for i, choice in enumerate(self.choices):
+            if choice.user_value is not None:
+                user.choice[:, i] = choice.user_value
+            if choice.user_selection is not None:
+                user.selection[:, i] = self._rows[choice.user_selection]
+        return user
+
+    def set_value(self, user, row, name, value):
+        '''Sets the user value of the symbol 'name' in configuration 'row', as
+        Symbol.set_value() does. 'value' is 0-2 or "n"/"m"/"y". Returns False
+        if the value is invalid for the symbol.'''
+        i = self.sym_index[name]
+        sym = self.syms[i]
+        value = STR_TO_TRI.get(value, value)
+        if value not in (0, 2) and not (value == 1 and sym.orig_type is TRISTATE):
+            return False
+
+        user.sym[row, i] = value
+        if sym.choice and value == 2:
+            user.selection[row, self.choices.index(sym.choice)] = i
+        return True
+
+    def load_configs(self, filenames):
+        '''Returns UserValues with the bool/tristate assignments of the .config
+        or defconfig files in 'filenames', read in the same way as
+        Kconfig.load_config().'''
+        user = self.user_values(len(filenames))
+        choice_index = dict((choice, i) for i, choice in enumerate(self.choices))
+        prefix = self.kconf.config_prefix
+
+        for row, filename in enumerate(filenames):
+            with open(filename, 'r') as f:
+                for _, kind, name, val in config_lines(f, prefix):
+                    i = self.sym_index.get(name)
+                    if i is None:
+                        continue
+                    sym = self.syms[i]
+
+                    if kind is LINE_SET:
+                        # Same checks as Kconfig._load_config()
+                        if not val.startswith(('y', 'n') if sym.orig_type is BOOL
+                                              else ('y', 'm', 'n')):
+                            continue
+                        val = STR_TO_TRI[val[0]]
+
+                        if sym.choice and val:
+                            choice = sym.choice
+                            if val == 2 or choice.orig_type is TRISTATE:
+                                user.choice[row, choice_index[choice]] = val
+                    elif kind is LINE_UNSET:
+                        val = 0
+                    else:
+                        continue
+
+                    user.sym[row, i] = val
+                    if sym.choice and val == 2:
+                        user.selection[row, choice_index[sym.choice]] = i
+
+        return user
+
+    def evaluate(self, user):
+        '''Evaluates all configurations in the UserValues 'user'. Returns
+        BatchValues.'''
+        n_syms = len(self.syms)
+        n_rows = n_syms + len(self.choices)
+        n_configs = len(user)
+
+        state = _State()
+        state.tri = np.zeros((n_rows, n_configs), np.int8)
+        state.vis = np.zeros((n_rows, n_configs), np.int8)
+        state.sel = np.full((len(self.choices), n_configs), -1, np.int32)
+        state.user = np.ascontiguousarray(user.sym.T)
+        state.choice_user = np.ascontiguousarray(user.choice.T)
+        state.choice_sel = np.ascontiguousarray(user.selection.T)
+
+        for step in self._steps:
+            step(state)
+
+        return BatchValues(self, state.tri[:n_syms].T, state.vis[:n_syms].T,
+                           state.tri[n_syms:].T, state.sel.T)
+
+    #
+    # Evaluation order
+    #
+
+    def _group_order(self):
+        # Returns lists of items to evaluate together, in dependency order.
+        #
+        # A choice and its symbols form one group: the choice symbols depend
+        # on the mode of the choice, and the selection depends on the
+        # visibility of all of them. The graph of groups has no loops, which
+        # Kconfig._check_dep_loop_sym() has made sure of. The modules symbol
+        # goes before all tristate items, as their types depend on it.
+
+        group_of = {}
+        groups = []
+        for sym in self.syms:
+            if sym.choice is None:
+                group_of[sym] = len(groups)
+                groups.append([sym])
+        for choice in self.choices:
+            group_of[choice] = len(groups)
+            groups.append([choice] + [sym for sym in choice.syms
+                                      if sym in self._rows])
+            for sym in groups[-1][1:]:
+                group_of[sym] = group_of[choice]
+
+        dependents = [set() for _ in groups]
+        for g, group in enumerate(groups):
+            for item in group:
+                for dep in item._dependents:
+                    d = group_of.get(dep)
+                    if d is not None and d != g:
+                        dependents[g].add(d)
+
+        modules = group_of.get(self.kconf.modules)
+        if modules is not None:
+            for g, group in enumerate(groups):
+                if g != modules and \
+                   any(item.orig_type is TRISTATE for item in group):
+                    dependents[modules].add(g)
+
+        n_deps = [0] * len(groups)
+        for deps in dependents:
+            for d in deps:
+                n_deps[d] += 1
+
+        ready = [g for g in range(len(groups)) if not n_deps[g]]
+        ready.reverse()
+        order = []
+        while ready:
+            g = ready.pop()
+            order.append(groups[g])
+            for d in sorted(dependents[g], reverse=True):
+                n_deps[d] -= 1
+                if not n_deps[d]:
+                    ready.append(d)
+
+        if len(order) != len(groups):
+            raise ValueError('dependency loop involving the modules symbol')
+
+        return order
+
+    #
+    # Compilation
+    #
+    # Expressions compile to either a constant (int) or a function that takes
+    # the value matrix and returns an array with one value per configuration.
+    #
+
+    def _compile_group(self, group):
+        if group[0].__class__ is Choice:
+            return self._compile_choice(group[0], group[1:])
+        return self._compile_sym(group[0])
+
+    def _expr(self, expr):
+        if expr.__class__ is not tuple:
+            row = self._rows.get(expr)
+            if row is None:
+                # Constant, undefined or not bool/tristate
+                return expr.tri_value
+            return lambda tri: tri[row]
+
+        if expr[0] is AND:
+            return _op(np.minimum, self._expr(expr[1]), self._expr(expr[2]))
+        if expr[0] is OR:
+            return _op(np.maximum, self._expr(expr[1]), self._expr(expr[2]))
+        if expr[0] is NOT:
+            return _op(np.subtract, 2, self._expr(expr[1]))
+        return self._relation(*expr)
+
+    def _relation(self, rel, sc1, sc2):
+        # Tables of the results for each value of the operands that are
+        # evaluated, filled in the same way as expr_value() compares
+
+        row1 = self._rows.get(sc1)
+        row2 = self._rows.get(sc2)
+        if row1 is None and row2 is None:
+            return kconfiglib.expr_value((rel, sc1, sc2))
+
+        vals1 = range(3) if row1 is not None else (None,)
+        vals2 = range(3) if row2 is not None else (None,)
+        table = np.array([_compare(rel, _operand(sc1, v1), _operand(sc2, v2))
+                          for v1 in vals1 for v2 in vals2], np.int8)
+
+        if row2 is None:
+            return lambda tri: table[tri[row1]]
+        if row1 is None:
+            return lambda tri: table[tri[row2]]
+        return lambda tri: table[tri[row1] * 3 + tri[row2]]
+
+    def _prompt_vis(self, item):
+        # max() of the prompt conditions, the first part of _visibility()
+        vis = 0
+        for node in item.nodes:
+            if node.prompt:
+                vis = _op(np.maximum, vis, self._expr(node.prompt[1]))
+        return vis
+
+    def _modules(self):
+        row = self._rows.get(self.kconf.modules)
+        if row is None:
+            return self.kconf.modules.tri_value
+        return lambda tri: tri[row]
+
+    def _compile_sym(self, sym):
+        # Symbol.tri_value and _visibility() of a non-choice symbol
+        row = self._rows[sym]
+        prompt_vis = self._prompt_vis(sym)
+        defaults = [(self._expr(default), self._expr(cond))
+                    for default, cond in sym.defaults]
+        weak_rev_dep = self._expr(sym.weak_rev_dep)
+        rev_dep = self._expr(sym.rev_dep)
+        direct_dep = self._expr(sym.direct_dep)
+        modules = self._modules()
+        is_bool = sym.orig_type is BOOL
+
+        def step(state):
+            tri = state.tri
+            n = tri.shape[1]
+
+            bool_type = True if is_bool else (_value(modules, tri, n) == 0)
+
+            vis = _value(prompt_vis, tri, n)
+            vis = np.where((vis == 1) & bool_type, 2, vis)
+
+            val = np.zeros(n, np.int8)
+            done = np.zeros(n, bool)
+            for default, cond in defaults:
+                cond = _value(cond, tri, n)
+                take = ~done & (cond != 0)
+                val = np.where(take, np.minimum(_value(default, tri, n), cond), val)
+                done |= take
+
+            weak = _value(weak_rev_dep, tri, n)
+            direct = _value(direct_dep, tri, n)
+            val = np.where((weak != 0) & (direct != 0), np.maximum(weak, val), val)
+
+            user = state.user[row]
+            val = np.where((vis != 0) & (user >= 0), np.minimum(user, vis), val)
+
+            val = np.maximum(val, _value(rev_dep, tri, n))
+            val = np.where((val == 1) & (bool_type | (weak == 2)), 2, val)
+
+            tri[row] = val
+            state.vis[row] = vis
+
+        return step
+
+    def _compile_choice(self, choice, syms):
+        # Choice.tri_value and selection, and Symbol.tri_value of the choice
+        # symbols
+        row = self._rows[choice]
+        c = row - len(self.syms)
+        rows = [self._rows[sym] for sym in syms]
+        prompt_vis = self._prompt_vis(choice)
+        sym_prompt_vis = [self._prompt_vis(sym) for sym in syms]
+        tristate_syms = [sym.orig_type is TRISTATE for sym in syms]
+        defaults = [(self._rows[sym], self._expr(cond))
+                    for sym, cond in choice.defaults if sym.choice is choice]
+        modules = self._modules()
+        base_mode = 0 if choice.is_optional else 1
+        tristate_choice = choice.orig_type is TRISTATE
+
+        def step(state):
+            tri = state.tri
+            vis_out = state.vis
+            n = tri.shape[1]
+
+            no_modules = _value(modules, tri, n) == 0
+            bool_choice = no_modules if tristate_choice else True
+
+            vis = _value(prompt_vis, tri, n)
+            vis = np.where((vis == 1) & bool_choice, 2, vis)
+            vis_out[row] = vis
+
+            mode = np.maximum(base_mode, state.choice_user[c])
+            mode = np.minimum(mode, vis)
+            mode = np.where((mode == 1) & bool_choice, 2, mode)
+            tri[row] = mode
+            y_mode = mode == 2
+
+            for sym_row, sym_vis, tristate in zip(rows, sym_prompt_vis,
+                                                  tristate_syms):
+                vis = _value(sym_vis, tri, n)
+                if tristate_choice and not tristate:
+                    vis = np.where(y_mode, vis, 0)
+                if tristate:
+                    vis = np.where(y_mode & (vis == 1), 0, vis)
+                not_tristate = True if not tristate else (y_mode | no_modules)
+                vis_out[sym_row] = np.where((vis == 1) & not_tristate, 2, vis)
+
+            # User selection if visible, the first visible default with a
+            # true condition, or the first visible symbol
+            user_sel = state.choice_sel[c]
+            sel = np.full(n, -1, np.int32)
+            has_user = user_sel >= 0
+            user_vis = vis_out[np.where(has_user, user_sel, 0), np.arange(n)]
+            sel = np.where(has_user & (user_vis != 0), user_sel, sel)
+            for sym_row, cond in defaults:
+                take = (sel < 0) & (_value(cond, tri, n) != 0) & \
+                       (vis_out[sym_row] != 0)
+                sel = np.where(take, sym_row, sel)
+            for sym_row in rows:
+                sel = np.where((sel < 0) & (vis_out[sym_row] != 0), sym_row, sel)
+            sel = np.where(y_mode, sel, -1)
+            state.sel[c] = sel
+
+            for sym_row in rows:
+                vis = vis_out[sym_row]
+                user = state.user[sym_row]
+                tri[sym_row] = np.where(vis == 2, 2 * (sel == sym_row),
+                                        (vis != 0) & (user > 0))
+
+        return step
+
+class _State(object):
+    # Arrays of one evaluate() call, (rows x configs). 'tri' holds the mode of
+    # choices in the rows after the symbols.
+    __slots__ = ('tri', 'vis', 'sel', 'user', 'choice_user', 'choice_sel')
+
+def _op(func, a, b):
+    # Combines two compiled expressions with the NumPy function 'func'
+    if a.__class__ is int and b.__class__ is int:
+        return int(func(a, b))
+    if a.__class__ is int:
+        return lambda tri: func(a, b(tri))
+    if b.__class__ is int:
+        return lambda tri: func(a(tri), b)
+    return lambda tri: func(a(tri), b(tri))
+
+def _value(expr, tri, n):
+    # Value of a compiled expression as an array for 'n' configurations
+    if expr.__class__ is int:
+        return np.full(n, expr, np.int8)
+    return expr(tri)
+
+def _operand(sc, tri_value):
+    # (orig_type, str_value, number or None) as expr_value() sees 'sc',
+    # with 'tri_value' for evaluated items
+    if tri_value is not None:
+        return (sc.orig_type, TRI_TO_STR[tri_value], tri_value)
+    try:
+        num = kconfiglib._sym_to_num(sc)
+    except ValueError:
+        num = None
+    return (sc.orig_type, sc.str_value, num)
+
+def _compare(rel, op1, op2):
+    if op1[0] is STRING and op2[0] is STRING or \
+       op1[2] is None or op2[2] is None:
+        comp = (op1[1] > op2[1]) - (op1[1] < op2[1])
+    else:
+        comp = op1[2] - op2[2]
+
+    if rel is EQUAL:         return 2*(comp == 0)
+    if rel is UNEQUAL:       return 2*(comp != 0)
+    if rel is LESS:          return 2*(comp < 0)
+    if rel is LESS_EQUAL:    return 2*(comp <= 0)
+    if rel is GREATER:       return 2*(comp > 0)
+    return 2*(comp >= 0)  # rel is GREATER_EQUAL
+
+if __name__ == '__main__':
+    from kconfigcache import load_kconfig
+
+    parser = argparse.ArgumentParser(
+        description='Show values of symbols in many configurations at once')
+    parser.add_argument('-c', '--cache', type=str, metavar='DIR',
+                        help='Directory to store parsed Kconfig snapshot')
+    parser.add_argument('-s', '--symbol', action='append', default=[],
+                        metavar='NAME', required=True,
+                        help='Symbol to show, may be given more than once')
+    parser.add_argument('kconfig', metavar='<Kconfig file>', type=str,
+                        help='Path to Kconfig')
+    parser.add_argument('configs', metavar='CONFIG', type=str, nargs='+',
+                        help='.config or defconfig files')
+    opts = parser.parse_args()
+
+    kconf = load_kconfig(opts.kconfig, opts.cache, warn=False)
+    ev = BatchEvaluator(kconf)
+    for name in opts.symbol:
+        if name not in ev.sym_index:
+            sys.exit('Unknown bool/tristate symbol "{}"'.format(name))
+
+    values = ev.evaluate(ev.load_configs(opts.configs))
+    columns = [values.column(name) for name in opts.symbol]
+    for row, filename in enumerate(opts.configs):
+        print('{}: {}'.format(filename, ' '.join(
+            '{}={}'.format(name, TRI_TO_STR[col[row]])
+            for name, col in zip(opts.symbol, columns))))
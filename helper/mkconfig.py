@@ -0,0 +1,255 @@
+############################################################################
+# helper/mkconfig.py
+#
+#   Copyright 2026 Sony Semiconductor Solutions Corporation
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+# 3. Neither the name of Sony Semiconductor Solutions Corporation nor
+#    the names of its contributors may be used to endorse or promote
+#    products derived from this software without specific prior written
+#    permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS
+# OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED
+# AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+############################################################################
+
+# Generate include/nuttx/config.h from .config without make.
+#
+# The output is the same as nuttx/tools/mkconfig, which 'make context' runs.
+# The config view regenerates the header on every save, and running make for
+# that takes seconds. Header files are only written when their contents
+# change, so unchanged configurations don't trigger rebuilds.
+#
+# Only config.h is made here. The header and footer around the definitions
+# are taken from the config.h that make generated last time, so they follow
+# the kernel version. When options used by the other 'make context' targets
+# (directory links, math.h and so on) are changed, nothing is written and
+# EXIT_MAKE is returned, to run make instead.
+
+import os
+import re
+import sys
+import argparse
+
+from kconfiglib import LINE_SET, config_lines
+
+# Exit status to request 'make context' instead
+EXIT_MAKE = 3
+
+# NuttX major versions DEQUOTE_LIST is taken from (tools/cfgdefine.c)
+SUPPORTED_VERSIONS = (10, 11, 12)
+
+# Options defined without the surrounding quotes, see nuttx/tools/cfgdefine.c.
+# Also checked against the previous config.h, see check_dequote().
+DEQUOTE_LIST = frozenset((
+    # NuttX
+    'CONFIG_DEBUG_OPTLEVEL',
+    'CONFIG_EXECFUNCS_NSYMBOLS_VAR',
+    'CONFIG_EXECFUNCS_SYMTAB_ARRAY',
+    'CONFIG_INIT_ARGS',
+    'CONFIG_INIT_SYMTAB',
+    'CONFIG_INIT_NEXPORTS',
+    'CONFIG_INIT_ENTRYPOINT',
+    'CONFIG_MODLIB_SYMTAB_ARRAY',
+    'CONFIG_MODLIB_NSYMBOLS_VAR',
+    'CONFIG_PASS1_BUILDIR',
+    'CONFIG_PASS1_TARGET',
+    'CONFIG_PASS1_OBJECT',
+    'CONFIG_TTY_LAUNCH_ENTRY',
+    'CONFIG_TTY_LAUNCH_ARGS',
+    # NxWidgets/NxWM
+    'CONFIG_NXWM_BACKGROUND_IMAGE',
+    'CONFIG_NXWM_CALIBRATION_ICON',
+    'CONFIG_NXWM_HEXCALCULATOR_ICON',
+    'CONFIG_NXWM_MINIMIZE_BITMAP',
+    'CONFIG_NXWM_NXTERM_ICON',
+    'CONFIG_NXWM_STARTWINDOW_ICON',
+    'CONFIG_NXWM_STOP_BITMAP',
+    # apps/
+    'CONFIG_NSH_SYMTAB_ARRAYNAME',
+    'CONFIG_NSH_SYMTAB_COUNTNAME',
+))
+
+# Options used by 'make context' for other than config.h: dirlinks
+# (include/arch, board and chip links) and the optional architecture headers
+CONTEXT_OPTIONS = (
+    'CONFIG_ARCH',
+    'CONFIG_ARCH_CHIP',
+    'CONFIG_ARCH_CHIP_CUSTOM',
+    'CONFIG_ARCH_CHIP_CUSTOM_DIR',
+    'CONFIG_ARCH_BOARD',
+    'CONFIG_ARCH_BOARD_CUSTOM',
+    'CONFIG_ARCH_BOARD_CUSTOM_DIR',
+    'CONFIG_ARCH_MATH_H',
+    'CONFIG_ARCH_FLOAT_H',
+    'CONFIG_ARCH_STDARG_H',
+    'CONFIG_ARCH_SETJMP_H',
+)
+
+# Markers of the definitions part in config.h made by tools/mkconfig
+_HEADER_END = '/* General Definitions'
+_FOOTER_START = '\n/* Sanity Checks'
+
+_define_match = re.compile(r'#(?:define (CONFIG_\w+) (.*)|undef (CONFIG_\w+))$').match
+
+# Value part of an assignment as mkconfig takes it: up to the first space
+# outside of double quotes
+_value_match = re.compile(r'(?:"(?:\\.|[^"\\])*"?|[^\s"]+)*').match
+
+def define(name, value):
+    '''Returns the config.h line for option 'name' (with CONFIG_) = 'value\''''
+    value = _value_match(value).group()
+
+    if name in DEQUOTE_LIST:
+        if value.endswith('"'):
+            value = value[:-1]
+        if value.startswith('"'):
+            value = value[1:]
+
+    if not value or value == 'n':
+        return '#undef {}\n'.format(name)
+    if value == 'y':
+        return '#define {} 1\n'.format(name)
+    if value == 'm':
+        return '#define {} 2\n'.format(name)
+    return '#define {} {}\n'.format(name, value)
+
+def parse_config_h(contents):
+    '''Returns (header, footer, defines) of config.h made by tools/mkconfig,
+    'defines' maps option name to the value or None for #undef. Returns None
+    if 'contents' doesn't look like one.'''
+    header_end = contents.find(_HEADER_END)
+    footer_start = contents.find(_FOOTER_START)
+    if header_end < 0 or footer_start < header_end:
+        return None
+    header_end = contents.find('\n', header_end) + 1
+
+    defines = {}
+    for line in contents[header_end:footer_start].splitlines():
+        match = _define_match(line)
+        if match:
+            name, value, undef = match.groups()
+            defines[name or undef] = value
+    return contents[:header_end], contents[footer_start:], defines
+
+def context_changed(defines, old_defines):
+    '''True if any of CONTEXT_OPTIONS differs between 'defines' and
+    'old_defines' (see parse_config_h())'''
+    return any(defines.get(name) != old_defines.get(name)
+               for name in CONTEXT_OPTIONS)
+
+def check_dequote(defines, old_defines):
+    '''Checks DEQUOTE_LIST against the previous config.h: a string option
+    quoted in one and not in the other means that the list doesn't match the
+    kernel'''
+    for name, value in defines.items():
+        old = old_defines.get(name)
+        if value is None or old is None:
+            continue
+        if value.startswith('"') != old.startswith('"'):
+            return False
+    return True
+
+def make_defines(f):
+    '''Returns the config.h lines and the {name: value} dict (see
+    parse_config_h()) for the .config file object 'f\''''
+    lines = []
+    defines = {}
+    for _, kind, name, value in config_lines(f):
+        # '# CONFIG_FOO is not set' lines are ignored by mkconfig too
+        if kind is LINE_SET:
+            line = define('CONFIG_' + name, value)
+            match = _define_match(line.rstrip('\n'))
+            defines[match.group(1) or match.group(3)] = match.group(2)
+            lines.append(line)
+    return lines, defines
+
+def write_if_changed(path, contents):
+    '''Writes 'contents' to 'path' unless it already has them. Returns True
+    if the file was written.'''
+    try:
+        with open(path, 'r') as f:
+            if f.read() == contents:
+                return False
+    except EnvironmentError:
+        pass
+
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    with open(path, 'w') as f:
+        f.write(contents)
+    return True
+
+def mkconfig(config, previous, outputs):
+    '''Generates config.h from 'config' into each path in 'outputs', using
+    'previous' config.h (made by make) for header, footer and checks. Returns
+    the list of paths that were written, or None if 'make context' is needed.'''
+    try:
+        with open(previous, 'r') as f:
+            parsed = parse_config_h(f.read())
+    except EnvironmentError:
+        return None
+    if parsed is None:
+        return None
+    header, footer, old_defines = parsed
+
+    with open(config, 'r') as f:
+        lines, defines = make_defines(f)
+    if context_changed(defines, old_defines) or \
+       not check_dequote(defines, old_defines):
+        return None
+
+    contents = header + ''.join(lines) + footer
+    return [path for path in outputs if write_if_changed(path, contents)]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create NuttX config.h from .config')
+    parser.add_argument('config', metavar='CONFIG', type=str, help='Path to .config')
+    parser.add_argument('outputs', metavar='OUTPUT', type=str, nargs='+',
+                        help='Path to config.h, may be given more than once. '
+                             'The first one must be made by make before')
+    parser.add_argument('--nuttx-version', type=str,
+                        help='NuttX version (MAJOR.MINOR) of the kernel')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    opts = parser.parse_args()
+
+    if opts.nuttx_version is not None:
+        try:
+            major = int(opts.nuttx_version.split('.')[0])
+        except ValueError:
+            major = None
+        if major not in SUPPORTED_VERSIONS:
+            if opts.verbose:
+                print('Unsupported NuttX version {}'.format(opts.nuttx_version))
+            sys.exit(EXIT_MAKE)
+
+    written = mkconfig(opts.config, opts.outputs[0], opts.outputs)
+    if written is None:
+        if opts.verbose:
+            print('make context is needed')
+        sys.exit(EXIT_MAKE)
+
+    for path in written:
+        if opts.verbose:
+            print('Updated {}'.format(path))
@@ -455,6 +455,8 @@ export class SDKConfigView {
 		 */
 
 		const args = [path.join(this._extensionPath, "helper", "kconfig2json.py").replace(/\\/g, '/').replace(/^(\w):/, '/$1')];
+		args.push('--cache', util.getKconfigCacheDir());
+		args.push('--prefetch');
 		args.push(this._sdkTmpKconfig);
 
 		this._progress.emit("update",
@@ -486,7 +488,7 @@ export class SDKConfigView {
 	private _initKernelKconfig(force: boolean) {
 		const dotconfig = path.join(this._kernelDir, ".config");
 
-		const options = { cwd: this._kernelDir };
+		let olddefconfig = false;
 
 		Promise.resolve().then(() => {
 			if (force || !fs.existsSync(dotconfig)) {
@@ -500,26 +502,13 @@ export class SDKConfigView {
 					return Promise.reject(e);
 				}
 
-				return new Promise<void>((resolve, reject) => {
-					console.log("olddefconfig");
-					this._currentProcess = cp.exec("make olddefconfig", options, (error, stdout, stderr) => {
-						this._currentProcess = undefined;
-						if (error) {
-							if (!error.killed) {
-								vscode.window.showErrorMessage(error.message);
-							}
-							// Remove .config file for reenterring in the next time.
-							fs.unlinkSync(dotconfig);
-							reject(error);
-						} else {
-							resolve();
-						}
-					});
-				});
+				// Updated by kconfig2json.py (--olddefconfig-file) while the
+				// Kconfig tree is parsed for the menu data.
+				olddefconfig = true;
 			}
 		})
 		.then(() => {
-			this._genKernelConfigMenuData();
+			this._genKernelConfigMenuData(olddefconfig);
 		})
 		.catch((reason) => {
 			console.error(reason);
@@ -527,7 +516,7 @@ export class SDKConfigView {
 		});
 	}
 
-	private _genKernelConfigMenuData() {
+	private _genKernelConfigMenuData(olddefconfig: boolean) {
 		const appsDir = path.join("..", "sdk", "tools", "empty_apps");
 		// Tentative: KCONFIG_CONFIG will be remove
 		const options = {
@@ -539,6 +528,7 @@ export class SDKConfigView {
 			maxBuffer: 10 * 1024 * 1024
 		};
 		console.log("Creating kernel config data");
+		let updateConfig = false;
 
 		this._progress.emit("update",
 			nls.localize("sdkconfig.src.progress.parse", "Parsing Kconfig"), 20);
@@ -571,6 +561,8 @@ export class SDKConfigView {
 						if (err) {
 							reject(err);
 						} else {
+							// Update the copy together with the kernel .config
+							updateConfig = true;
 							resolve();
 						}
 					});
@@ -585,8 +577,20 @@ export class SDKConfigView {
 			// This replace logic would be affected only when this._extensionPath is windows path, Linux and macOS
 			// would not be changed.
 			const args = [path.join(this._extensionPath, "helper", "kconfig2json.py").replace(/\\/g, '/').replace(/^(\w):/, '/$1')];
+			args.push('--cache', util.getKconfigCacheDir());
+			args.push('--prefetch');
+			if (olddefconfig) {
+				args.push('--olddefconfig-file', path.join(this._kernelDir, '.config'));
+			}
+			if (updateConfig) {
+				args.push('--olddefconfig');
+			}
 			cp.execFile(this._python, args, options, (err, stdout, stderr) => {
 				if (err) {
+					if (olddefconfig) {
+						// Remove .config file for reenterring in the next time.
+						fs.unlinkSync(path.join(this._kernelDir, '.config'));
+					}
 					vscode.window.showErrorMessage(nls.localize("sdkconfig.src.progress.error.parse", "Kconfig parse error"));
 					this.dispose();
 				} else {
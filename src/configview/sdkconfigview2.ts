@@ -30,6 +30,11 @@ import * as nls from '../localize';
 import { getNonce, isSameContents, getNuttXVersion, Version } from '../common';
 import * as util from './util';
 
+// Exit status of kconfig2json.py stopped by "cancel" (EXIT_CANCELLED)
+const KCONFIG2JSON_CANCELLED = 3;
+// Exit status of mkconfig.py when 'make context' is needed (EXIT_MAKE)
+const MKCONFIG_NEED_MAKE = 3;
+
 export class SDKConfigView2 {
 
 	public static currentPanel: SDKConfigView2 | undefined;
@@ -48,6 +53,7 @@ export class SDKConfigView2 {
 	private _python: string;
 	private _progress: EventEmitter;
 	private _currentProcess: cp.ChildProcess | undefined = undefined;
+	private _kconfigProcess: cp.ChildProcess | undefined = undefined;
 	private kernelVer?: Version;
 
 	public static createOrShow(extensionPath: string, targetConfig: string | undefined) {
@@ -153,9 +159,10 @@ export class SDKConfigView2 {
 						Promise.resolve().then(() => {
 							return new Promise<void>((resolve) => {
 								this._saveConfigFile(this._configFile, message.content);
-								this._updateHeaderFiles();
-								this._panel.webview.postMessage({command: "saved"});
-								resolve();
+								this._updateHeaderFiles().then(() => {
+									this._panel.webview.postMessage({command: "saved"});
+									resolve();
+								});
 							});
 						});
 						return;
@@ -249,16 +256,59 @@ export class SDKConfigView2 {
 	 *
 	 * This function update config dependent header files (ex. config.h).
 	 * And this operation is necessary for code completion and worker build.
+	 *
+	 * Once 'make context' has been done, config.h is generated by helper script in the same
+	 * way as tools/mkconfig in NuttX, into kernel and project folder at a time, without make.
+	 * The header files are only written when changed.
+	 * Other files created by 'make context' also depend on some options (directory links by
+	 * CONFIG_ARCH, CONFIG_ARCH_CHIP and CONFIG_ARCH_BOARD, include/math.h by CONFIG_ARCH_MATH_H,
+	 * etc.). When they are changed, or the kernel version is not supported by the script, it
+	 * exits with MKCONFIG_NEED_MAKE and make is run instead.
 	 */
 
-	private _updateHeaderFiles() {
+	private _updateHeaderFiles(): Promise<void> {
 		const workspaceFolder = vscode.workspace.getWorkspaceFolder(vscode.Uri.file(this._configFile));
 		if (!workspaceFolder) {
-			return;
+			return Promise.resolve();
 		}
 
 		const srcDir = path.resolve(this._kernelDir, "include", "nuttx");
 		const destDir = path.resolve(workspaceFolder.uri.fsPath, '.vscode', 'include', 'nuttx');
+
+		if (!fs.existsSync(path.resolve(srcDir, 'version.h')) ||
+			!fs.existsSync(path.resolve(this._kernelDir, 'include', 'arch'))) {
+			this._makeHeaderFiles(srcDir, destDir);
+			return Promise.resolve();
+		}
+
+		// Script path must be MSYS style, see _genKernelConfigMenuData().
+		const args = [path.join(this._extensionPath, "helper", "mkconfig.py").replace(/\\/g, '/').replace(/^(\w):/, '/$1')];
+		args.push(path.join(this._kernelDir, '.config'));
+		args.push(path.resolve(srcDir, 'config.h'));
+		args.push(path.resolve(destDir, 'config.h'));
+		if (this.kernelVer) {
+			args.push('--nuttx-version', `${this.kernelVer.major}.${this.kernelVer.minor}`);
+		}
+
+		return new Promise<void>((resolve) => {
+			cp.execFile(this._python, args, { cwd: this._kernelDir }, (err) => {
+				if (err && err.code === MKCONFIG_NEED_MAKE) {
+					this._makeHeaderFiles(srcDir, destDir);
+				} else if (err) {
+					vscode.window.showErrorMessage(err.message);
+				}
+				resolve();
+			});
+		});
+	}
+
+	/**
+	 * Update config dependent header files by make
+	 *
+	 * Used when 'make context' has not been done yet, or it must be done again.
+	 */
+
+	private _makeHeaderFiles(srcDir: string, destDir: string) {
 		const options = { cwd: this._kernelDir };
 
 		let args;
@@ -483,6 +533,10 @@ export class SDKConfigView2 {
 		if (this._currentProcess) {
 			this._currentProcess.kill();
 		}
+		if (this._kconfigProcess) {
+			// kconfig2json.py stops at the next step and exits by itself
+			this._kconfigProcess.stdin?.end("cancel\n");
+		}
 
 		this._progress.emit("update", "Closed", 100);
 
@@ -503,7 +557,7 @@ export class SDKConfigView2 {
 	private _initKernelKconfig(force: boolean) {
 		const dotconfig = path.join(this._kernelDir, ".config");
 
-		const options = { cwd: this._kernelDir };
+		let olddefconfig = false;
 
 		Promise.resolve().then(() => {
 			if (force || !fs.existsSync(dotconfig)) {
@@ -518,26 +572,13 @@ export class SDKConfigView2 {
 					return Promise.reject(e);
 				}
 
-				return new Promise<void>((resolve, reject) => {
-					console.log("olddefconfig");
-					this._currentProcess = cp.exec("make olddefconfig", options, (error, stdout, stderr) => {
-						this._currentProcess = undefined;
-						if (error) {
-							if (!error.killed) {
-								vscode.window.showErrorMessage(error.message);
-							}
-							// Remove .config file for reenterring in the next time.
-							fs.unlinkSync(dotconfig);
-							reject(error);
-						} else {
-							resolve();
-						}
-					});
-				});
+				// Updated by kconfig2json.py (--olddefconfig-file) while the
+				// Kconfig tree is parsed for the menu data.
+				olddefconfig = true;
 			}
 		})
 		.then(() => {
-			this._genKernelConfigMenuData();
+			this._genKernelConfigMenuData(olddefconfig);
 		})
 		.catch((reason) => {
 			console.error(reason);
@@ -545,7 +586,7 @@ export class SDKConfigView2 {
 		});
 	}
 
-	private _genKernelConfigMenuData() {
+	private _genKernelConfigMenuData(olddefconfig: boolean) {
 		const appsDir = path.join("..", "sdk", "apps");
 		let kernelDir = this._kernelDir;
 
@@ -577,6 +618,7 @@ export class SDKConfigView2 {
 			maxBuffer: 20 * 1024 * 1024
 		};
 		console.log("Creating kernel config data");
+		let updateConfig = false;
 
 		this._progress.emit("update",
 			nls.localize("sdkconfig.src.progress.parse", "Parsing Kconfig"), 20);
@@ -610,6 +652,8 @@ export class SDKConfigView2 {
 						if (err) {
 							reject(err);
 						} else {
+							// Update the copy together with the kernel .config
+							updateConfig = true;
 							resolve();
 						}
 					});
@@ -624,16 +668,57 @@ export class SDKConfigView2 {
 			// This replace logic would be affected only when this._extensionPath is windows path, Linux and macOS
 			// would not be changed.
 			const args = [path.join(this._extensionPath, "helper", "kconfig2json.py").replace(/\\/g, '/').replace(/^(\w):/, '/$1')];
-			cp.execFile(this._python, args, options, (err, stdout, stderr) => {
-				if (err) {
-					console.error(stderr);
-					vscode.window.showErrorMessage(nls.localize("sdkconfig.src.progress.error.parse", "Kconfig parse error"));
-					this.dispose();
-				} else {
+			args.push('--cache', util.getKconfigCacheDir());
+			args.push('--prefetch');
+			if (olddefconfig) {
+				args.push('--olddefconfig-file', path.join(this._kernelDir, '.config'));
+			}
+			if (updateConfig) {
+				args.push('--olddefconfig');
+			}
+			args.push('--progress');
+
+			// Menu data may be several tens of MB on large trees, so it is collected from the
+			// stream rather than by execFile() with limited buffer. Progress is written to stderr
+			// as JSON lines, and other lines are error messages.
+			const proc = cp.spawnFile(this._python, args, {cwd: options.cwd, env: options.env});
+			const stdout: Buffer[] = [];
+			const errors: string[] = [];
+			let rest = "";
+			this._kconfigProcess = proc;
+			proc.stdout?.on("data", (chunk: Buffer) => stdout.push(chunk));
+			proc.stderr?.on("data", (chunk: Buffer) => {
+				const lines = (rest + chunk.toString()).split(/\r?\n/);
+				rest = lines.pop() || "";
+				lines.forEach((line) => this._kconfigProgress(line, errors));
+			});
+			proc.on("error", (err) => errors.push(err.message));
+			proc.on("close", (code) => {
+				this._kconfigProcess = undefined;
+				if (rest) {
+					this._kconfigProgress(rest, errors);
+				}
+				if (code === 0) {
+					if (SDKConfigView2.currentPanel !== this) {
+						// Finished just after the panel is closed
+						return;
+					}
 					this._progress.emit("update",
 						nls.localize("sdkconfig.src.progress.menu", "Construct menu"), 40);
-					this._panel.webview.postMessage({command: "init", content: stdout.toString()});
+					this._panel.webview.postMessage({command: "init", content: Buffer.concat(stdout).toString()});
+					return;
 				}
+				if (olddefconfig) {
+					// Remove .config file for reenterring in the next time.
+					fs.unlinkSync(path.join(this._kernelDir, '.config'));
+				}
+				if (code === KCONFIG2JSON_CANCELLED) {
+					// Cancelled by dispose(), the panel is already closed.
+					return;
+				}
+				console.error(errors.join("\n"));
+				vscode.window.showErrorMessage(nls.localize("sdkconfig.src.progress.error.parse", "Kconfig parse error"));
+				this.dispose();
 			});
 		})
 		.catch((reason) => {
@@ -642,6 +727,26 @@ export class SDKConfigView2 {
 		});
 	}
 
+	private _kconfigProgress(line: string, errors: string[]) {
+		let record;
+		try {
+			record = JSON.parse(line);
+		} catch {
+			record = undefined;
+		}
+		if (!record || typeof record !== "object" || !("progress" in record)) {
+			errors.push(line);
+			return;
+		}
+		if (record.progress === "parse" || record.progress === "load_kconfig") {
+			this._progress.emit("update",
+				`${nls.localize("sdkconfig.src.progress.parse", "Parsing Kconfig")} (${record.files})`, 20);
+		} else if (record.progress === "menudata" || record.progress === "output") {
+			this._progress.emit("update",
+				nls.localize("sdkconfig.src.progress.menu", "Construct menu"), 30);
+		}
+	}
+
 	private _getViewContent() {
 		const webview = this._panel.webview;
 		const mainPath = vscode.Uri.file(path.join(this._resourcePath, 'main.js'));
@@ -1,6 +1,7 @@
 import * as vscode from 'vscode';
 import * as path from 'path';
 import * as fs from 'fs';
+import * as os from 'os';
 
 import * as cp from '../shell_exec';
 
@@ -48,6 +49,40 @@ export function getPythonPath(): string | undefined {
 	return python;
 }
 
+let kconfigCacheDir: string | undefined = undefined;
+
+/**
+ * Set directory for parsed Kconfig snapshot
+ *
+ * Called at activation with a folder in the extension's global storage.
+ *
+ * @param dir Path to cache directory
+ */
+
+export function setKconfigCacheDir(dir: string) {
+	kconfigCacheDir = dir;
+}
+
+/**
+ * Get directory for parsed Kconfig snapshot
+ *
+ * kconfig2json.py reuses parsed Kconfig tree stored in this directory while
+ * Kconfig files are not changed. The snapshots are loaded by pickle, so the
+ * directory must be private to the user, never a shared one like /tmp. The
+ * script creates it with mode 0700 and refuses files owned by others.
+ *
+ * @return Path to cache directory, converted to MSYS style on Windows.
+ */
+
+export function getKconfigCacheDir(): string {
+	let dir = kconfigCacheDir;
+	if (!dir) {
+		const cacheHome = process.env.XDG_CACHE_HOME || path.join(os.homedir(), ".cache");
+		dir = path.join(cacheHome, "spresense-kconfig-cache");
+	}
+	return dir.replace(/\\/g, '/').replace(/^(\w):/, '/$1');
+}
+
 /**
  * Tweak configuration
  *
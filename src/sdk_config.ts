@@ -27,11 +27,13 @@ import * as nls from './localize';
 
 import { SDKConfigView } from './configview/sdkconfigview';
 import { SDKConfigView2 } from './configview/sdkconfigview2';
+import { setKconfigCacheDir } from './configview/util';
 import { getSDKVersion, checkSdkCompatibility } from './common';
 
 export function activate(context: vscode.ExtensionContext) {
 
 	nls.config(context);
+	setKconfigCacheDir(path.join(context.globalStorageUri.fsPath, "kconfig-cache"));
 
 	context.subscriptions.push(
 		vscode.commands.registerCommand('spresense.sdkconfig', async (uri:vscode.Uri) => {
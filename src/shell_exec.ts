@@ -108,6 +108,28 @@ export function execFile(file: string, args: string[], options?: cp.ExecOptions,
 	return exec(command, options, callback);
 }
 
+export function spawnFile(file: string, args: string[], options?: cp.SpawnOptions): cp.ChildProcess {
+	const pathVar = getEnvPATH();
+	const shell = getDefaultShellPath();
+	let command = file;
+	args.forEach((arg) => {
+		command = command + ' \"' + arg + '\" ';
+	});
+
+	if (!options) {
+		options = {};
+	}
+
+	if (options.env) {
+		options.env['PATH'] = pathVar;
+	} else {
+		options.env = {PATH: pathVar};
+	}
+
+	/* Same as execFile(), but stdio are left to the caller as streams */
+	return cp.spawn(shell, ['-c', command], options);
+}
+
 export function execSync(command: string, options?: cp.ExecOptions): Buffer | string {
 	const pathVar = getEnvPATH();
 	const shell = getDefaultShellPath();
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Benchmark for Kconfig helper pipeline (kconfiglib and kconfig2json).
+#
+# Each phase is run against synthetic Kconfig trees and random .config
+# generated by kconfiggen.py, and the best time of some repeats and the peak
+# memory are stored into JSON file. Pass previous result file with --compare
+# to find regressions.
+
+import os, sys
+import time
+import json
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+_here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_here, '..', '..', 'helper'))
+
+import kconfiglib
+import kconfig2json
+import kconfiggen
+
+DEFAULT_SIZES = [1000, 5000, 10000, 50000]
+
+class Context:
+    def __init__(self, srctree, workdir):
+        self.srctree = srctree
+        self.workdir = workdir
+        self.kconf = None
+        self.menudata = None
+        self.outdir = workdir
+
+    def path(self, name):
+        return os.path.join(self.outdir, name)
+
+    def new_outdir(self):
+        # Write functions skip the files they have written already if nothing
+        # changed, so each run writes into a new directory to do actual work.
+        self.outdir = tempfile.mkdtemp(dir=self.workdir)
+
+#
+# Phases, run in this order. Each phase has setup function (not measured)
+# and the phase function itself.
+#
+
+def setup_none(ctx):
+    pass
+
+def setup_write(ctx):
+    ctx.new_outdir()
+
+def setup_reevaluate(ctx):
+    # All user values should be there to be unset on each repeat
+    ctx.kconf.load_config(os.path.join(ctx.srctree, '.config'))
+
+def phase_parse(ctx):
+    ctx.kconf = kconfiglib.Kconfig(os.path.join(ctx.srctree, 'Kconfig'), warn=False)
+
+def phase_write_config(ctx):
+    ctx.kconf.write_config(ctx.path('.config'))
+
+def phase_write_min_config(ctx):
+    ctx.kconf.write_min_config(ctx.path('defconfig'))
+
+def phase_load_config(ctx):
+    ctx.kconf.load_config(os.path.join(ctx.srctree, '.config'))
+
+def phase_sync_deps(ctx):
+    ctx.kconf.sync_deps(ctx.path('deps'))
+
+def phase_reevaluate(ctx):
+    kconf = ctx.kconf
+    kconf.unset_values()
+    for sym in kconf.unique_defined_syms:
+        sym.str_value
+    for choice in kconf.unique_choices:
+        choice.selection
+
+def phase_evaluate_shallow(ctx):
+    # Same work as reevaluate, in dependency order. Guards against deep
+    # recursion, and is not expected to be faster.
+    kconf = ctx.kconf
+    kconf.unset_values()
+    kconf.evaluate_shallow()
+
+def phase_build_nodetree(ctx):
+    ctx.menudata = kconfig2json.make_menudata(ctx.kconf)
+
+def phase_json_dumps(ctx):
+    json.dumps(ctx.menudata)
+
+PHASES = [
+    ('parse',            setup_none,       phase_parse),
+    ('write_config',     setup_write,      phase_write_config),
+    ('write_min_config', setup_write,      phase_write_min_config),
+    ('load_config',      setup_none,       phase_load_config),
+    ('sync_deps',        setup_write,      phase_sync_deps),
+    ('reevaluate',       setup_reevaluate, phase_reevaluate),
+    ('evaluate_shallow', setup_reevaluate, phase_evaluate_shallow),
+    ('build_nodetree',   setup_none,       phase_build_nodetree),
+    ('json_dumps',       setup_none,       phase_json_dumps),
+]
+
+def run_phases(ctx, repeat):
+    result = {}
+    for name, setup, func in PHASES:
+        best = None
+        for _ in range(repeat):
+            setup(ctx)
+            start = time.perf_counter()
+            func(ctx)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        result[name] = {'time': best}
+    return result
+
+def measure_memory(ctx, result):
+    # tracemalloc slows down allocations, so memory is measured in another
+    # pass from timing.
+
+    for name, setup, func in PHASES:
+        setup(ctx)
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        func(ctx)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result[name]['peak'] = peak - base
+
+def bench(size, repeat, seed):
+    with tempfile.TemporaryDirectory(prefix='kconfigbench') as tmpdir:
+        srctree = os.path.join(tmpdir, 'tree')
+        workdir = os.path.join(tmpdir, 'work')
+        os.makedirs(workdir)
+        kconfiggen.generate(srctree, size, seed)
+
+        os.environ['srctree'] = srctree
+        ctx = Context(srctree, workdir)
+        phases = run_phases(ctx, repeat)
+        measure_memory(Context(srctree, workdir), phases)
+
+        kconf = ctx.kconf
+        return {
+            'size': size,
+            'symbols': len(kconf.unique_defined_syms),
+            'choices': len(kconf.unique_choices),
+            'nodes': sum(1 for _ in kconf.node_iter()),
+            'phases': phases,
+        }
+
+def compare(results, basefile, threshold):
+    with open(basefile, 'r') as f:
+        base = {r['size']: r for r in json.load(f)['results']}
+
+    regressions = 0
+    for r in results:
+        b = base.get(r['size'])
+        if b is None:
+            continue
+        for name, value in r['phases'].items():
+            old = b['phases'].get(name)
+            if old is None:
+                continue
+            for key in ('time', 'peak'):
+                if not old.get(key):
+                    continue
+                ratio = value[key] / old[key]
+                mark = ''
+                if ratio > threshold:
+                    mark = ' REGRESSION'
+                    regressions += 1
+                print('%6d %-16s %-4s %6.2fx%s' % (r['size'], name, key, ratio, mark))
+    return regressions
+
+def print_results(results):
+    print('%6s %-16s %10s %10s' % ('size', 'phase', 'time [ms]', 'peak [KB]'))
+    for r in results:
+        for name, value in r['phases'].items():
+            print('%6d %-16s %10.2f %10d' % (r['size'], name, value['time'] * 1000,
+                                             value['peak'] // 1024))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Kconfig helper pipeline')
+    parser.add_argument('-s', '--sizes', type=str,
+                        default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help='Comma separated number of symbols (default: %(default)s)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Repeat count of each phase, best time is taken (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for tree generator')
+    parser.add_argument('-o', '--output', type=str, default='bench.json',
+                        help='Output JSON file (default: %(default)s)')
+    parser.add_argument('--compare', metavar='FILE', type=str,
+                        help='Compare with previous result JSON file')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='Ratio to be reported as regression (default: %(default)s)')
+    opts = parser.parse_args()
+
+    results = []
+    for size in [int(s) for s in opts.sizes.split(',')]:
+        print('Running %d symbols...' % size, file=sys.stderr)
+        results.append(bench(size, opts.repeat, opts.seed))
+
+    data = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'kconfiglib': '.'.join(str(v) for v in kconfiglib.VERSION),
+        'repeat': opts.repeat,
+        'seed': opts.seed,
+        'results': results,
+    }
+    with open(opts.output, 'w') as f:
+        json.dump(data, f, indent=2)
+
+    print_results(results)
+
+    if opts.compare:
+        if compare(results, opts.compare, opts.threshold):
+            sys.exit(1)
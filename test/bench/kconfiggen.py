@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Synthetic Kconfig tree generator for benchmarks and scaling tests.
+#
+# Generated trees have NuttX like shape (top level menus sourcing nested
+# directories, one Kconfig file per component) so kconfiglib and kconfig2json
+# can be measured without Spresense SDK clone. Random .config and defconfig
+# fragment matching to the tree are generated together.
+#
+# Output is reproducible for the same arguments.
+
+import os
+import random
+import argparse
+
+# Top level menus, taken from NuttX
+TOPICS = ['ARCH', 'BOARD', 'SCHED', 'DRIVERS', 'NET', 'FS', 'GRAPHICS',
+          'AUDIO', 'SENSORS', 'LIBC', 'SYSTEM', 'EXAMPLES']
+
+# Symbols in one component Kconfig file
+SYMBOLS_PER_FILE = 40
+
+# Symbols in one choice
+CHOICE_SIZE = 4
+
+# Ratio of hidden symbols (no prompt), targets of 'select' and 'imply' like
+# ARCH_HAVE_* in NuttX
+HIDDEN_RATIO = 0.1
+
+# Ratio of types in other symbols
+TYPE_RATIO = [('bool', 0.75), ('int', 0.13), ('hex', 0.05), ('string', 0.07)]
+
+# Words for help text
+WORDS = ['enable', 'support', 'driver', 'device', 'buffer', 'size', 'number',
+         'interrupt', 'configure', 'default', 'option', 'feature', 'memory',
+         'task', 'priority', 'stack', 'select', 'use', 'this', 'the', 'for']
+
+class Generator:
+    """
+    Generate Kconfig tree.
+
+    symbols:
+      Number of symbols, including choice members and hidden symbols.
+
+    menus:
+      Number of top level menus (default: symbols / 400)
+
+    choices:
+      Number of choices (default: symbols / 100)
+
+    depth:
+      Depth of directories sourced from top level Kconfig. Every directory
+      has menu, and the symbols are defined in the deepest ones.
+
+    fanout:
+      Maximum number of 'select' and 'imply' in a bool symbol.
+
+    chain:
+      Maximum length of 'depends on' chains, the symbol depends on the
+      previous one.
+
+    help_lines:
+      Maximum lines of help text.
+
+    seed:
+      Random seed.
+    """
+
+    def __init__(self, symbols=1000, menus=None, choices=None, depth=3,
+                 fanout=2, chain=8, help_lines=4, seed=0):
+        self.rnd = random.Random(seed)
+        self.depth = max(1, depth)
+        self.fanout = fanout
+        self.chain = chain
+        self.help_lines = help_lines
+
+        nhidden = int(symbols * HIDDEN_RATIO) if fanout > 0 else 0
+        self.hidden = ['HAVE_OPT%d' % i for i in range(nhidden)]
+
+        if choices is None:
+            choices = symbols // 100
+        choices = max(0, min(choices, (symbols - nhidden) // CHOICE_SIZE))
+        if menus is None:
+            menus = symbols // 400
+        self.menus = max(1, menus)
+
+        # Kind of each entry in the order of definition. Choice takes
+        # CHOICE_SIZE symbols.
+
+        nrest = max(0, symbols - nhidden - choices * CHOICE_SIZE)
+        kinds = ['choice'] * choices
+        for kind, ratio in TYPE_RATIO:
+            kinds += [kind] * int(nrest * ratio)
+        kinds += ['bool'] * (nrest + choices - len(kinds))
+        self.rnd.shuffle(kinds)
+        self.kinds = kinds
+
+        self.count = 0
+        self.syms = []      # (name, type, choice members) of visible symbols
+        self.bools = []     # Visible bool symbols, targets of 'depends on'
+        self.chain_tail = None
+        self.chain_len = 0
+
+    def _name(self, topic):
+        self.count += 1
+        return '%s_OPT%d' % (topic, self.count)
+
+    def _depends(self, lines, is_bool):
+        # Dependencies only refer to symbols defined before, and hidden
+        # symbols are never used for it, so generated trees have no
+        # dependency loop.
+
+        deps = []
+        if self.chain_tail and self.chain_len < self.chain and self.rnd.random() < 0.5:
+            deps.append(self.chain_tail)
+            self.chain_len += 1
+        elif is_bool:
+            self.chain_len = 0
+        if self.bools and self.rnd.random() < 0.2:
+            dep = self.rnd.choice(self.bools[-200:])
+            if self.rnd.random() < 0.3:
+                dep = '(%s || !%s)' % (dep, self.rnd.choice(self.bools))
+            deps.append(dep)
+        if deps:
+            lines.append('\tdepends on %s' % ' && '.join(deps))
+
+    def _help(self, lines):
+        n = self.rnd.randint(0, self.help_lines)
+        if n == 0:
+            return
+        lines.append('\t---help---')
+        for _ in range(n):
+            words = [self.rnd.choice(WORDS) for _ in range(self.rnd.randint(4, 12))]
+            lines.append('\t\t' + ' '.join(words).capitalize() + '.')
+
+    def _bool(self, topic, lines):
+        name = self._name(topic)
+        lines.append('config %s' % name)
+        lines.append('\tbool "Enable %s"' % name)
+        lines.append('\tdefault %s' % self.rnd.choice('yn'))
+        self._depends(lines, True)
+        for keyword in ('select', 'imply'):
+            if self.hidden and self.rnd.random() < 0.2:
+                n = self.rnd.randint(1, self.fanout)
+                for target in self.rnd.sample(self.hidden, min(n, len(self.hidden))):
+                    lines.append('\t%s %s' % (keyword, target))
+        self._help(lines)
+
+        self.syms.append((name, 'bool', None))
+        self.bools.append(name)
+        self.chain_tail = name
+
+    def _choice(self, topic, lines):
+        members = [self._name(topic) for _ in range(CHOICE_SIZE)]
+        lines.append('choice')
+        lines.append('\tprompt "%s selection"' % members[0])
+        lines.append('\tdefault %s' % self.rnd.choice(members))
+        self._depends(lines, False)
+        self._help(lines)
+        for name in members:
+            lines.append('')
+            lines.append('config %s' % name)
+            lines.append('\tbool "%s"' % name)
+            self.syms.append((name, 'bool', members))
+        lines.append('')
+        lines.append('endchoice')
+
+    def _value(self, topic, kind, lines):
+        name = self._name(topic)
+        lines.append('config %s' % name)
+        if kind == 'int':
+            lines.append('\tint "%s value"' % name)
+            lines.append('\tdefault %d' % self.rnd.randint(0, 100))
+            lines.append('\trange 0 1000')
+        elif kind == 'hex':
+            lines.append('\thex "%s address"' % name)
+            lines.append('\tdefault 0x%x' % self.rnd.randint(0, 0xffff))
+        else:
+            lines.append('\tstring "%s name"' % name)
+            lines.append('\tdefault "%s"' % name.lower())
+        self._depends(lines, False)
+        self._help(lines)
+        self.syms.append((name, kind, None))
+
+    def _entries(self, topic, lines, end):
+        # Define entries until 'end' visible symbols are defined in total.
+        # Overrun by choice is taken back by following files.
+
+        while self.kinds and len(self.syms) < end:
+            kind = self.kinds.pop()
+            if kind == 'bool':
+                self._bool(topic, lines)
+            elif kind == 'choice':
+                self._choice(topic, lines)
+            else:
+                self._value(topic, kind, lines)
+            lines.append('')
+
+    def _write(self, outdir, relpath, lines):
+        path = os.path.join(outdir, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def _dir(self, outdir, reldir, title, topic, start, end, level):
+        # Visible symbols from 'start' to 'end' are defined in this directory
+
+        nsyms = end - start
+        lines = ['menu "%s"' % title, '']
+        if level == self.depth or nsyms <= SYMBOLS_PER_FILE:
+            self._entries(topic, lines, end)
+        else:
+            # Split to sub directories, so the deepest ones have about
+            # SYMBOLS_PER_FILE symbols.
+
+            nfiles = -(-nsyms // SYMBOLS_PER_FILE)
+            branch = max(2, round(nfiles ** (1.0 / (self.depth - level))))
+            for i in range(branch):
+                subdir = '%s/sub%d' % (reldir, i)
+                lines.append('source "%s/Kconfig"' % subdir)
+                self._dir(outdir, subdir, '%s %d' % (title, i), topic,
+                          start + nsyms * i // branch,
+                          start + nsyms * (i + 1) // branch, level + 1)
+            lines.append('')
+        lines.append('endmenu')
+        self._write(outdir, reldir + '/Kconfig', lines)
+
+    def generate(self, outdir):
+        """
+        Write Kconfig tree into 'outdir' and return path to the top level
+        Kconfig file.
+        """
+        top = ['mainmenu "Synthetic Configuration"', '']
+        nvisible = sum(CHOICE_SIZE if k == 'choice' else 1 for k in self.kinds)
+        for i in range(self.menus):
+            topic = TOPICS[i % len(TOPICS)]
+            reldir = '%s%d' % (topic.lower(), i)
+            top.append('source "%s/Kconfig"' % reldir)
+            self._dir(outdir, reldir, '%s %d' % (topic.capitalize(), i), topic,
+                      nvisible * i // self.menus,
+                      nvisible * (i + 1) // self.menus, 1)
+
+        top.append('')
+        for name in self.hidden:
+            top.append('config %s' % name)
+            top.append('\tbool')
+            top.append('')
+        self._write(outdir, 'Kconfig', top)
+
+        return os.path.join(outdir, 'Kconfig')
+
+    def _random_value(self, name, kind, selected):
+        if kind == 'bool':
+            if selected is not None:
+                return 'y' if name == selected else 'n'
+            return self.rnd.choice('yn')
+        if kind == 'int':
+            return str(self.rnd.randint(0, 1000))
+        if kind == 'hex':
+            return '0x%x' % self.rnd.randint(0, 0xffff)
+        return '"%s"' % self.rnd.choice(WORDS)
+
+    def write_configs(self, config, defconfig, ratio=0.1):
+        """
+        Write random values of all visible symbols to 'config', and values
+        of randomly picked 'ratio' of them to 'defconfig'. Call after
+        generate(). Values may conflict with dependencies, as real world
+        ones do.
+        """
+        lines = []
+        selected = {}
+        for name, kind, members in self.syms:
+            if members is not None and members[0] not in selected:
+                selected[members[0]] = self.rnd.choice(members)
+            val = self._random_value(name, kind,
+                                     selected[members[0]] if members else None)
+            if val == 'n':
+                lines.append('# CONFIG_%s is not set' % name)
+            else:
+                lines.append('CONFIG_%s=%s' % (name, val))
+
+        with open(config, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        with open(defconfig, 'w') as f:
+            for line in lines:
+                if self.rnd.random() < ratio:
+                    f.write(line + '\n')
+
+def generate(outdir, symbols=1000, seed=0, config=True, **kwargs):
+    """
+    Generate synthetic Kconfig tree with 'symbols' symbols into 'outdir',
+    and return path to the top level Kconfig file. Paths in 'source' are
+    relative to 'outdir', so set it to $srctree before parsing.
+
+    If 'config' is True, random .config and defconfig fragment are also
+    written into 'outdir'. Other arguments are passed to Generator.
+    """
+    gen = Generator(symbols, seed=seed, **kwargs)
+    path = gen.generate(outdir)
+    if config:
+        gen.write_configs(os.path.join(outdir, '.config'),
+                          os.path.join(outdir, 'defconfig'))
+    return path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic Kconfig tree')
+    parser.add_argument('outdir', metavar='DIR', type=str, help='Output directory')
+    parser.add_argument('-n', '--symbols', type=int, default=1000,
+                        help='Number of symbols (default: %(default)s)')
+    parser.add_argument('-m', '--menus', type=int, help='Number of top level menus')
+    parser.add_argument('-c', '--choices', type=int, help='Number of choices')
+    parser.add_argument('-d', '--depth', type=int, default=3,
+                        help='Depth of sourced directories (default: %(default)s)')
+    parser.add_argument('-f', '--fanout', type=int, default=2,
+                        help='Maximum select/imply in a symbol (default: %(default)s)')
+    parser.add_argument('--chain', type=int, default=8,
+                        help='Maximum length of depends on chain (default: %(default)s)')
+    parser.add_argument('--help-lines', type=int, default=4,
+                        help='Maximum lines of help text (default: %(default)s)')
+    parser.add_argument('--no-config', action='store_true',
+                        help='Do not generate .config and defconfig')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='Random seed')
+    opts = parser.parse_args()
+
+    print(generate(opts.outdir, opts.symbols, opts.seed, not opts.no_config,
+                   menus=opts.menus, choices=opts.choices, depth=opts.depth,
+                   fanout=opts.fanout, chain=opts.chain,
+                   help_lines=opts.help_lines))
@@ -1,10 +1,23 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os
+import os, sys
 import subprocess as sp
 import glob
 import shutil
+import argparse
+import multiprocessing
+import tempfile
+import json
+
+from defconfig import Defconfig
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'helper'))
+import kconfiglib
+from kconfiglib import BOOL, TRISTATE, MENU, LINE_SET, LINE_UNSET, config_lines, expr_value
+
+# Parsed kernel Kconfig tree, shared with batch workers by fork()
+_kconf = None
 
 def create_cuidotconfig(sdkdir, name):
     src = os.path.normpath(os.path.join(sdkdir, '..', 'nuttx', '.config'))
@@ -21,7 +34,7 @@ def create_cuidotconfig(sdkdir, name):
     os.makedirs(_dir, exist_ok=True)
     shutil.copy(src, dest)
 
-def prepare(sdkdir):
+def list_defconfigs(sdkdir):
     cmd = ['./tools/config.py', '-l']
     proc = sp.Popen(cmd, cwd=sdkdir, stdout=sp.PIPE)
 
@@ -33,21 +46,107 @@ def prepare(sdkdir):
         if n >= 2: # Skip header 2 lines
             list_ += [line]
 
-    for c in list_:
+    return list_
+
+def load_kernel_kconfig(sdkdir):
+    ''' Parse kernel Kconfig tree with kconfiglib
+    Environment is the same as SDKConfigView2._genKernelConfigMenuData().
+    '''
+
+    kerneldir = os.path.normpath(os.path.join(os.path.abspath(sdkdir), '..', 'nuttx'))
+    appsdir = os.path.join('..', 'sdk', 'apps')
+    sp.run(['make', 'dirlinks', 'apps_preconfig'], cwd=kerneldir, check=True,
+           stdout=sp.DEVNULL, env=dict(os.environ, APPSDIR=appsdir))
+
+    os.environ.update({'srctree': kerneldir,
+                       'APPSDIR': appsdir,
+                       'EXTERNALDIR': 'dummy',
+                       'APPSBINDIR': appsdir,
+                       'BINDIR': kerneldir})
+    return kconfiglib.Kconfig(os.path.join(kerneldir, 'Kconfig'), warn=False)
+
+def create_libdotconfig(sdkdir, name):
+    ''' Batch worker, create lib.config for one defconfig
+    Loads the defconfig into _kconf and writes it out, same as
+    'make olddefconfig' after tools/config.py.
+    '''
+
+    dest = os.path.join('results', name, 'lib.config')
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+    defconfig = Defconfig(sdkdir)
+    defconfig.apply(name)
+    with tempfile.NamedTemporaryFile('w', suffix='.defconfig', delete=False) as fh:
+        tmp = fh.name
+    try:
+        defconfig.saveas(tmp)
+        _kconf.load_config(tmp)
+    finally:
+        os.remove(tmp)
+    _kconf.write_config(dest, save_old=False)
+
+    return name
+
+def _create_libdotconfig(args):
+    return create_libdotconfig(*args)
+
+def prepare_batch(sdkdir, jobs=None, need_kconf=False):
+    ''' Create lib.config for all defconfigs in parallel
+    Kconfig tree is parsed only once in this process, and workers started by
+    fork() share it by copy-on-write. It is not parsed when all lib.config
+    exist, unless need_kconf is True. Returns the Kconfig instance or None.
+    '''
+
+    global _kconf
+
+    names = [c for c in list_defconfigs(sdkdir)
+             if not os.path.exists(os.path.join('results', c, 'lib.config'))]
+    if not names and not need_kconf:
+        return None
+
+    _kconf = load_kernel_kconfig(sdkdir)
+    if not names:
+        return _kconf
+
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(jobs) as pool:
+        for name in pool.imap_unordered(_create_libdotconfig,
+                                        [(sdkdir, c) for c in names]):
+            print(f'Create config from {name}', flush=True)
+
+    return _kconf
+
+def prepare(sdkdir):
+    for c in list_defconfigs(sdkdir):
         create_cuidotconfig(sdkdir, c)
 
-def compare_configs(_dir):
+def compare_configs(_dir, basis='cui.config', kconf=None, jsonpath=None):
+    ''' Compare all basis and gui.config pairs
+    If kconf is given, configs are compared by symbols with diff_config(), and
+    the differences are saved to jsonpath as {directory: diff}.
+    '''
 
-    basisfiles = sorted(glob.glob('**/cui.config', recursive=True))
+    basisfiles = sorted(glob.glob(f'**/{basis}', recursive=True))
     configfiles = sorted(glob.glob('**/gui.config', recursive=True))
     assert len(basisfiles) == len(configfiles)
 
     result = True
+    diffs = {}
     for (a, b) in zip(basisfiles, configfiles):
         assert os.path.dirname(a) == os.path.dirname(b) 
-        if compare_config(a, b) == False:
+        if kconf is not None:
+            diff = diff_config(kconf, a, b)
+            print_diff(os.path.dirname(a), diff)
+            diffs[os.path.dirname(a)] = diff
+            if diff['menus']:
+                result = False
+        elif compare_config(a, b) == False:
             result = False
 
+    if jsonpath is not None:
+        with open(jsonpath, 'w') as fh:
+            json.dump(diffs, fh, indent=2)
+
     return result
 
 def read_config(path):
@@ -78,8 +177,155 @@ def compare_config(a, b):
 
     return result
 
+def read_config_values(kconf, path):
+    ''' Read config file into {symbol name: value}
+    Lines are split by kconfiglib.config_lines(), same as
+    Kconfig.load_config(). Disabled options are left out, same as
+    read_config().
+    '''
+
+    ret = {}
+    with open(path) as fh:
+        for _, kind, name, val in config_lines(fh, kconf.config_prefix):
+            if kind == LINE_SET and val != 'n':
+                ret[name] = val
+            elif kind in (LINE_SET, LINE_UNSET):
+                ret.pop(name, None)
+    return ret
+
+def menu_path(sym):
+    ''' Menu path of the first definition of sym, e.g. "RTOS Features > Tasks" '''
+
+    if not sym.nodes:
+        return ''
+
+    prompts = []
+    node = sym.nodes[0].parent
+    while node is not None and node is not sym.kconfig.top_node:
+        if node.prompt and (node.item is MENU or node.is_menuconfig):
+            prompts.append(node.prompt[0])
+        node = node.parent
+    return ' > '.join(reversed(prompts))
+
+def value_reason(sym):
+    ''' Tell where the current value of sym comes from
+    Returns 'select', 'imply' or 'default' if the value is what the symbol
+    gets without a user value, 'user' if it differs from that, or 'none' if
+    nothing gives a value. A full .config sets user values on all visible
+    symbols, so only values that differ from the Kconfig defaults are 'user'.
+    This follows the evaluation order in kconfiglib Symbol.tri_value and
+    Choice._get_selection_from_defaults().
+    '''
+
+    if sym.choice:
+        choice = sym.choice
+        if choice.selection is not sym:
+            return 'user' if choice.user_selection is sym else 'none'
+
+        default = None
+        for s, cond in choice.defaults:
+            if expr_value(cond) and s.visibility:
+                default = s
+                break
+        else:
+            default = next((s for s in choice.syms if s.visibility), None)
+        return 'default' if default is sym else 'user'
+
+    if sym.orig_type not in (BOOL, TRISTATE):
+        for default, cond in sym.defaults:
+            if expr_value(cond):
+                return 'default' if default.str_value == sym.str_value else 'user'
+        return 'user' if sym.str_value else 'none'
+
+    # Value without user value
+    val, reason = 0, 'none'
+    for default, cond in sym.defaults:
+        dep = expr_value(cond)
+        if dep:
+            val, reason = min(expr_value(default), dep), 'default'
+            break
+
+    weak = expr_value(sym.weak_rev_dep)
+    if weak > val and expr_value(sym.direct_dep):
+        val, reason = weak, 'imply'
+
+    rev = expr_value(sym.rev_dep)
+    if rev and rev >= val:
+        val, reason = rev, 'select'
+
+    if val == 1 and (sym.type is BOOL or weak == 2):
+        val = 2
+
+    if sym.tri_value == val:
+        return reason
+    return 'user'
+
+def diff_config(kconf, a, b):
+    ''' Compare config files a and b by symbols
+    Returns
+      {"added": <count>, "removed": <count>, "changed": <count>,
+       "menus": {<menu path>: [<entry>, ...]}}
+    where <entry> is
+      {"name": <symbol>, "change": "added"|"removed"|"changed",
+       "a": <value or null>, "b": <value or null>,
+       "reason": {"a": <reason>, "b": <reason>}}
+    "added" means only in b. See value_reason() for reasons.
+    '''
+
+    avals = read_config_values(kconf, a)
+    bvals = read_config_values(kconf, b)
+
+    entries = []
+    for name in sorted(set(avals) | set(bvals)):
+        aval = avals.get(name)
+        bval = bvals.get(name)
+        if aval == bval:
+            continue
+        change = 'added' if aval is None else 'removed' if bval is None else 'changed'
+        entries.append({'name': name, 'change': change, 'a': aval, 'b': bval,
+                        'reason': {}})
+
+    # Explain values of differing symbols on both sides
+    for side, path in (('a', a), ('b', b)):
+        if not entries:
+            break
+        kconf.load_config(path)
+        for e in entries:
+            sym = kconf.syms.get(e['name'])
+            e['reason'][side] = value_reason(sym) if sym and sym.nodes else 'undefined'
+
+    ret = {'added': 0, 'removed': 0, 'changed': 0, 'menus': {}}
+    for e in entries:
+        ret[e['change']] += 1
+        sym = kconf.syms.get(e['name'])
+        ret['menus'].setdefault(menu_path(sym) if sym else '', []).append(e)
+
+    return ret
+
+def print_diff(name, diff):
+    print(f'  - Comparing config {name}')
+    for menu, entries in diff['menus'].items():
+        print(f'    [{menu or "(top)"}]')
+        for e in entries:
+            r = e['reason']
+            print(f"      X {e['name']}: {e['a']} ({r['a']}) -> {e['b']} ({r['b']})", flush=True)
+
 if __name__ == '__main__':
-    prepare('.harness/spresense/sdk')
-    result = compare_configs('results')
+    parser = argparse.ArgumentParser(description='Compare configs created by CUI and extension')
+    parser.add_argument('-j', '--jobs', type=int, nargs='?', const=0, default=None,
+                        help='Create basis configs with kconfiglib in parallel (default: CPU count)')
+    parser.add_argument('--sdkdir', default='.harness/spresense/sdk', help='Path to spresense/sdk')
+    parser.add_argument('--json', metavar='FILE',
+                        help='Compare by symbols and save the differences as JSON')
+    opts = parser.parse_args()
+
+    if opts.jobs is None:
+        prepare(opts.sdkdir)
+        kconf = load_kernel_kconfig(opts.sdkdir) if opts.json else None
+        result = compare_configs('results', kconf=kconf, jsonpath=opts.json)
+    else:
+        kconf = prepare_batch(opts.sdkdir, opts.jobs or None, bool(opts.json))
+        result = compare_configs('results', 'lib.config',
+                                 kconf if opts.json else None, opts.json)
     s = 'passed' if result else 'failed'
     print(f'Comparing config files {s}.')
@@ -5,11 +5,17 @@ import os, sys
 import re
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'helper'))
+from kconfiglib import LINE_MALFORMED, config_lines
+
 # XXX: This code taken from spresense/sdk/tools/config.py.
 # I hope this logic to be shared with extension (TypeScript) or config.py.
 
-is_not_set = re.compile(r'^# (?P<symbol>.*) is not set')
-is_config = re.compile(r'(?P<symbol>^CONFIG_.*)=(?P<value>.*)')
+# Options related to host environment, see tweak_platform()
+HOSTENV_OPTIONS = ('HOST_LINUX', 'HOST_WINDOWS', 'HOST_MACOS', 'HOST_OTHER',
+                   'WINDOWS_NATIVE', 'WINDOWS_CYGWIN', 'WINDOWS_MSYS',
+                   'WINDOWS_UBUNTU', 'WINDOWS_OTHER',
+                   'SIM_X8664_MICROSOFT', 'SIM_X8664_SYSTEMV')
 
 # Path to apps directory from nuttx
 APPSDIR = '"../sdk/apps"'
@@ -27,38 +33,18 @@ class Defconfig:
         # XXX: Only SDK2.0 or above
         return os.path.join(self.sdkdir, 'configs', name, 'defconfig')
 
-    def __is_hostenv(self, string):
-        if re.match(r'[# ]*(CONFIG_|)HOST_LINUX', string): return True
-        if re.match(r'[# ]*(CONFIG_|)HOST_WINDOWS', string): return True
-        if re.match(r'[# ]*(CONFIG_|)HOST_MACOS', string): return True
-        if re.match(r'[# ]*(CONFIG_|)HOST_OTHER', string): return True
-        if re.match(r'[# ]*(CONFIG_|)WINDOWS_NATIVE', string): return True
-        if re.match(r'[# ]*(CONFIG_|)WINDOWS_CYGWIN', string): return True
-        if re.match(r'[# ]*(CONFIG_|)WINDOWS_MSYS', string): return True
-        if re.match(r'[# ]*(CONFIG_|)WINDOWS_UBUNTU', string): return True
-        if re.match(r'[# ]*(CONFIG_|)WINDOWS_OTHER', string): return True
-        if re.match(r'[# ]*(CONFIG_|)SIM_X8664_MICROSOFT', string): return True
-        if re.match(r'[# ]*(CONFIG_|)SIM_X8664_SYSTEMV', string): return True
-        return False
+    def __is_hostenv(self, sym):
+        # sym is symbol name without 'CONFIG_'
+        return sym.startswith(HOSTENV_OPTIONS)
 
     def load(self):
         self.opts = {}
         with open(self.path, 'r') as f:
-            for line in f:
-                if self.__is_hostenv(line):
-                    continue
-
-                m = is_not_set.match(line.strip())
-                if m:
-                    sym = m.group('symbol').replace('CONFIG_', '', 1)
-                    self.opts[sym] = 'n'
-                else:
-                    m = is_config.match(line)
-                    if m:
-                        sym = m.group('symbol').replace('CONFIG_', '', 1)
-                        self.opts[sym] = m.group('value')
-                    else:
-                        logging.debug('[IGNORE]: %s' % line.strip())
+            for _, kind, sym, val in config_lines(f):
+                if kind == LINE_MALFORMED:
+                    logging.debug('[IGNORE]: %s' % sym)
+                elif not self.__is_hostenv(sym):
+                    self.opts[sym] = val
 
     def tweak_platform(self, platform=None):
         # We need tweak options related to host environment.
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+''' kconfig2json.py server mode (--serve) test
+
+Sends JSON-RPC 2.0 requests to kconfig2json.py in server mode with the
+boolean test vector in kconfigtree/, and checks the responses. Unlike the
+test suites run by test.py, no browser is needed.
+
+    $ python3 rpc_test.py
+'''
+
+import os, sys
+import json
+import subprocess as sp
+import unittest
+
+_here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_here, '..', 'helper'))
+
+import kconfig2json
+from kconfiglib import Kconfig
+
+KCONFIG2JSON = os.path.join(_here, '..', 'helper', 'kconfig2json.py')
+KCONFIG = os.path.join(_here, 'kconfigtree', 'bool', 'Kconfig')
+
+def request(kconf, **req):
+    return kconfig2json.handle_request(kconf, json.dumps(dict(jsonrpc='2.0', **req)))
+
+class HandleRequestTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.kconf = Kconfig(KCONFIG, warn=False)
+
+    def test_result(self):
+        res = request(self.kconf, id=1, method='get_values', params={'names': ['BOOL']})
+        self.assertEqual(res, {'jsonrpc': '2.0', 'id': 1, 'result': {'BOOL': 'n'}})
+
+    def test_error(self):
+        res = request(self.kconf, id=2, method='get_values', params={'names': 5})
+        self.assertEqual(res['id'], 2)
+        self.assertEqual(res['error']['code'], kconfig2json.RPC_INVALID_PARAMS)
+
+        res = request(self.kconf, id=3, method='no_such_method')
+        self.assertEqual(res['error']['code'], kconfig2json.RPC_METHOD_NOT_FOUND)
+
+    def test_notification(self):
+        self.assertIsNone(request(self.kconf, method='set_value',
+                                  params={'name': 'BOOL', 'value': 'n'}))
+
+    def test_failing_notification(self):
+        # No response to notifications, even on errors
+        self.assertIsNone(request(self.kconf, method='no_such_method'))
+        self.assertIsNone(request(self.kconf, method='get_values', params={'names': 5}))
+        self.assertIsNone(request(self.kconf, method='set_value', params={'name': 'NO_SUCH'}))
+
+    def test_invalid_request(self):
+        # It is unknown whether these were notifications, so answered with null id
+        res = kconfig2json.handle_request(self.kconf, '{')
+        self.assertEqual(res['id'], None)
+        self.assertEqual(res['error']['code'], kconfig2json.RPC_PARSE_ERROR)
+
+        res = kconfig2json.handle_request(self.kconf, '{"jsonrpc": "2.0", "method": 1}')
+        self.assertEqual(res['id'], None)
+        self.assertEqual(res['error']['code'], kconfig2json.RPC_INVALID_REQUEST)
+
+class ServeTest(unittest.TestCase):
+    def test_serve(self):
+        # A failing notification between two requests must not produce a
+        # response, which the client would take for the next one
+        requests = [
+            {'jsonrpc': '2.0', 'id': 1, 'method': 'get_values', 'params': {'names': ['BOOL']}},
+            {'jsonrpc': '2.0', 'method': 'get_values', 'params': {'names': 5}},
+            {'jsonrpc': '2.0', 'id': 2, 'method': 'set_value', 'params': {'name': 'BOOL', 'value': 'y'}},
+        ]
+        proc = sp.run([sys.executable, KCONFIG2JSON, '--serve', KCONFIG],
+                      input=''.join(json.dumps(r) + '\n' for r in requests),
+                      stdout=sp.PIPE, stderr=sp.DEVNULL, universal_newlines=True,
+                      check=True)
+        responses = [json.loads(line) for line in proc.stdout.splitlines()]
+        self.assertEqual([r['id'] for r in responses], [1, 2])
+        self.assertEqual(responses[1]['result'], True)
+
+if __name__ == '__main__':
+    unittest.main()